@@ -1,9 +1,12 @@
 from datetime import datetime
-from dataclasses import dataclass, asdict, field
-from typing import Optional, Union
+from dataclasses import dataclass, field, fields
+from itertools import repeat
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Union
 
+import numpy as np
 
-@dataclass
+
+@dataclass(slots=True)
 class OperationDTO:
     date: Optional[Union[str, datetime]]
     operation_type: str
@@ -34,11 +37,238 @@ class OperationDTO:
                 self.aci = 0.0
 
     def to_dict(self):
-        result = asdict(self)
-        # Если date - это datetime, преобразуем его в строку для сериализации
-        if isinstance(self.date, datetime):
-            result['date'] = self.date.isoformat()
-        # Удаляем служебное поле
-        if '_sort_key' in result:
-            del result['_sort_key']
-        return result
+        # Поля перечислены явно: без asdict (глубокого копирования) и служебного _sort_key
+        return {
+            "date": self.date.isoformat() if isinstance(self.date, datetime) else self.date,
+            "operation_type": self.operation_type,
+            "payment_sum": self.payment_sum,
+            "currency": self.currency,
+            "ticker": self.ticker,
+            "isin": self.isin,
+            "price": self.price,
+            "quantity": self.quantity,
+            "aci": self.aci,
+            "comment": self.comment,
+            "operation_id": self.operation_id,
+        }
+
+
+OPERATION_FIELDS = [f.name for f in fields(OperationDTO) if f.init]
+_FIELD_DEFAULTS = {f.name: f.default for f in fields(OperationDTO) if f.init}
+
+DATE_FORMAT_LENGTH = len("YYYY-MM-DD HH:MM:SS")
+
+
+def _date_column(value: Any) -> Any:
+    """
+    Даты вида 'YYYY-MM-DD HH:MM:SS' хранятся как datetime64[s] (8 байт на строку).
+    Если хоть одна строка не переводится туда и обратно без изменений —
+    колонка остаётся строковой.
+    """
+    if not isinstance(value, np.ndarray) or value.dtype != object or not len(value):
+        return value
+    try:
+        typed = value.astype("datetime64[s]")
+    except (ValueError, TypeError):
+        return value
+    if all(isinstance(v, str) and len(v) == DATE_FORMAT_LENGTH for v in value) \
+            and (_format_dates(typed) == value).all():
+        return typed
+    return value
+
+
+def _format_dates(values: np.ndarray) -> np.ndarray:
+    if not len(values):
+        return np.empty(0, dtype=object)
+    return np.char.replace(np.datetime_as_string(values, unit="s"), "T", " ").astype(object)
+
+
+def _date_sort_key(dates: np.ndarray) -> np.ndarray:
+    """
+    Целочисленный ключ сортировки по дате: секунды datetime64 (NaT/None — раньше всех).
+    Строковые даты ('YYYY-MM-DD' и 'YYYY-MM-DD HH:MM:SS') приводятся к datetime64,
+    а если это невозможно — заменяются номером строки в лексикографическом порядке.
+    """
+    if dates.dtype.kind != "M":
+        try:
+            dates = np.array(dates, dtype="datetime64[s]")
+        except (ValueError, TypeError):
+            _, rank = np.unique(dates.astype(str), return_inverse=True)
+            return rank.astype(np.int64)
+    return dates.astype("datetime64[s]").view(np.int64)
+
+
+def _merge_order(keys: Sequence[np.ndarray]) -> np.ndarray:
+    """
+    Порядок строк склейки уже отсортированных последовательностей ключей
+    (попарное векторное слияние через searchsorted). Устойчиво: при равных
+    ключах раньше идёт строка более ранней последовательности.
+    """
+    merged = keys[0]
+    order = np.arange(len(merged), dtype=np.intp)
+    offset = len(merged)
+    for key in keys[1:]:
+        pos_a = np.searchsorted(key, merged, side="left") + np.arange(len(merged))
+        pos_b = np.searchsorted(merged, key, side="right") + np.arange(len(key))
+        size = len(merged) + len(key)
+        next_keys = np.empty(size, dtype=np.int64)
+        next_order = np.empty(size, dtype=np.intp)
+        next_keys[pos_a], next_keys[pos_b] = merged, key
+        next_order[pos_a], next_order[pos_b] = order, np.arange(offset, offset + len(key))
+        merged, order = next_keys, next_order
+        offset += len(key)
+    return order
+
+
+def _as_array(value: Any, length: int) -> np.ndarray:
+    if isinstance(value, np.ndarray):
+        return value
+    if isinstance(value, (bool, str)) or value is None or not isinstance(value, (int, float)):
+        out = np.empty(length, dtype=object)
+        out[:] = [value] * length
+        return out
+    return np.full(length, value)
+
+
+class OperationBatch:
+    """
+    Колоночное представление списка операций: по колонке на каждое поле
+    OperationDTO. Колонка — numpy-массив (date — datetime64[s], суммы, цены,
+    количество, НКД — числовые dtype, строки — object) либо скаляр, общий
+    для всех строк. В словари формата OperationDTO.to_dict() превращается
+    только при сериализации (to_dicts / итерация).
+    """
+    __slots__ = ("length", "columns")
+
+    def __init__(self, length: int, columns: Dict[str, Any]):
+        self.length = length
+        self.columns = columns
+
+    @classmethod
+    def from_columns(cls, length: int, **columns: Any) -> "OperationBatch":
+        """
+        Колонки одинаковой длины: numpy-массивы, pandas Series, списки
+        или скаляры (не переданное поле берёт значение по умолчанию OperationDTO).
+        Значения должны быть уже нормализованы.
+        """
+        normalized = {}
+        for name in OPERATION_FIELDS:
+            value = columns.get(name, _FIELD_DEFAULTS.get(name, ""))
+            if hasattr(value, "to_numpy"):
+                value = value.to_numpy()
+            elif isinstance(value, (list, tuple)):
+                array = np.empty(len(value), dtype=object)
+                array[:] = value
+                value = array
+            normalized[name] = value
+        normalized["date"] = _date_column(normalized["date"])
+        return cls(length, normalized)
+
+    @classmethod
+    def empty(cls) -> "OperationBatch":
+        return cls.from_columns(0, **{name: [] for name in OPERATION_FIELDS})
+
+    @classmethod
+    def concat(cls, batches: Sequence["OperationBatch"]) -> "OperationBatch":
+        """
+        Склейка батчей. Числовые колонки с разным dtype (int у акций и float
+        у валюты) склеиваются в object, чтобы каждое значение сохранило свой тип.
+        """
+        batches = [b for b in batches if b.length]
+        if not batches:
+            return cls.empty()
+        if len(batches) == 1:
+            return batches[0]
+        length = sum(b.length for b in batches)
+        columns = {}
+        for name in OPERATION_FIELDS:
+            values = [b.columns[name] for b in batches]
+            if not any(isinstance(v, np.ndarray) for v in values) and all(v == values[0] for v in values):
+                columns[name] = values[0]
+                continue
+            parts = [_as_array(v, b.length) for v, b in zip(values, batches)]
+            if len({p.dtype for p in parts}) > 1:
+                parts = [_format_dates(p) if p.dtype.kind == "M" else p.astype(object) for p in parts]
+            columns[name] = np.concatenate(parts)
+        return cls(length, columns)
+
+    @classmethod
+    def merge_sorted(cls, batches: Sequence["OperationBatch"]) -> "OperationBatch":
+        """
+        Слияние батчей, каждый из которых уже отсортирован по дате (sort_by_date).
+        Результат — тот же, что concat(batches).sort_by_date(), но без полной
+        сортировки: k-way слияние по целочисленному ключу даты.
+        """
+        batches = [b for b in batches if b.length]
+        if len(batches) < 2:
+            return batches[0] if batches else cls.empty()
+        order = _merge_order([b.sort_key() for b in batches])
+        return cls.concat(batches).take(order)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def sort_key(self) -> np.ndarray:
+        """
+        Ключ сортировки по дате (int64 на строку), см. _date_sort_key.
+        """
+        dates = self.columns["date"]
+        if not isinstance(dates, np.ndarray):
+            return np.zeros(self.length, dtype=np.int64)
+        return _date_sort_key(dates)
+
+    def take(self, indices: np.ndarray) -> "OperationBatch":
+        """
+        Строки по позициям (фильтр/перестановка); скалярные колонки не копируются.
+        """
+        columns = {
+            name: value[indices] if isinstance(value, np.ndarray) else value
+            for name, value in self.columns.items()
+        }
+        return OperationBatch(len(indices), columns)
+
+    def sort_by_date(self) -> "OperationBatch":
+        """
+        Устойчивая сортировка по дате (по целочисленному ключу sort_key):
+        строки с одинаковой датой сохраняют исходный порядок.
+        """
+        if not isinstance(self.columns["date"], np.ndarray) or self.length < 2:
+            return self
+        key = self.sort_key()
+        if (key[1:] >= key[:-1]).all():
+            return self
+        return self.take(np.argsort(key, kind="stable"))
+
+    def map_column(self, name: str, func: Callable[[Any], Any]) -> None:
+        """
+        Применяет func к колонке, по одному вызову на различное значение.
+        """
+        value = self.columns[name]
+        if not isinstance(value, np.ndarray):
+            self.columns[name] = func(value)
+            return
+        cache: Dict[Any, Any] = {}
+        mapped = np.empty(len(value), dtype=object)
+        for i, v in enumerate(value.tolist()):
+            if v not in cache:
+                cache[v] = func(v)
+            mapped[i] = cache[v]
+        self.columns[name] = mapped
+
+    def column(self, name: str) -> Any:
+        """
+        Колонка в виде значений Python (для сериализации): список или итератор.
+        """
+        value = self.columns[name]
+        if not isinstance(value, np.ndarray):
+            return repeat(value, self.length)
+        if value.dtype.kind == "M":
+            value = _format_dates(value)
+        return value.tolist()
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for row in zip(*(self.column(name) for name in OPERATION_FIELDS)):
+            yield dict(zip(OPERATION_FIELDS, row))
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return list(self)
@@ -0,0 +1,247 @@
+# batch.py
+#
+# Пакетный разбор архива выписок: python -m batch ФАЙЛЫ_ИЛИ_КАТАЛОГИ ...
+# Файлы раздаются пулу процессов порциями; ошибка одного файла не
+# останавливает пакет, а журнал (--manifest) позволяет продолжить
+# прерванный прогон с того же места.
+
+import argparse
+import json
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from fast_json import dumps
+from fileio import write_atomic
+
+STATEMENT_EXTENSIONS = (".xls", ".xlsx")
+
+#  Порция: (имя файла в отчёте, путь или содержимое)
+BatchItem = Tuple[str, Any]
+#  Итог по файлу: (имя, JSON результата или None, текст ошибки или None)
+BatchResult = Tuple[str, Optional[bytes], Optional[str]]
+
+
+def is_statement(name: str) -> bool:
+    return name.lower().endswith(STATEMENT_EXTENSIONS)
+
+
+def collect_statements(paths: Iterable[str]) -> List[Tuple[str, str]]:
+    """
+    Выписки из списка файлов и каталогов (каталоги — рекурсивно, только
+    .xls/.xlsx, в порядке имён). Возвращает пары (путь, относительное имя):
+    для каталога имя берётся относительно него, для файла — базовое имя.
+    """
+    found: List[Tuple[str, str]] = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if is_statement(name):
+                        full = os.path.join(root, name)
+                        found.append((full, os.path.relpath(full, path)))
+        elif os.path.exists(path):
+            found.append((path, os.path.basename(path)))
+        else:
+            raise FileNotFoundError(f"Нет такого файла или каталога: {path}")
+    return found
+
+
+def parse_chunk(items: Sequence[BatchItem], engine: Optional[str] = None,
+                indent: bool = False) -> List[BatchResult]:
+    """
+    Разбирает порцию выписок в процессе-воркере и сразу кодирует каждую в
+    JSON (как encode_statement), чтобы обратно передавались только байты.
+    Исключение при разборе файла становится его ошибкой, остальные файлы
+    порции разбираются дальше.
+    """
+    from fast_json import encode_statement
+    from full_statement import parse_full_statement_batch
+
+    results: List[BatchResult] = []
+    for name, source in items:
+        try:
+            result = parse_full_statement_batch(source, engine)
+            results.append((name, encode_statement(result, indent=indent, allow_nan=indent), None))
+        except Exception as e:
+            results.append((name, None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def batch_record(name: str, body: Optional[bytes], error: Optional[str]) -> bytes:
+    """
+    Запись общего потока по одному файлу (без перевода строки):
+    {"file": ..., "result": {...}} или {"file": ..., "error": "..."}.
+    body уже закодирован воркером и вставляется как есть.
+    """
+    if error is not None:
+        return dumps({"file": name, "error": error})
+    return b'{"file":' + dumps(name) + b',"result":' + body + b"}"
+
+
+def chunked(items: Sequence[Any], size: int) -> List[Sequence[Any]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def default_chunk_size(count: int, workers: int) -> int:
+    # около четырёх порций на воркер: равномерная загрузка без лишних пересылок
+    return max(1, min(16, math.ceil(count / (4 * workers))))
+
+
+class Manifest:
+    """
+    Журнал прогона: по JSON-строке на обработанный файл
+    ({"file": абсолютный путь, "status": "ok" | "error", ...}).
+    Запись дописывается только после того, как результат файла записан,
+    поэтому прерванный прогон продолжается без потерь и повторов.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # строка, оборванная при аварийной остановке
+                    self.done[entry["file"]] = entry["status"]
+        self._fh = open(path, "a", encoding="utf-8")
+
+    def completed(self, path: str, retry_errors: bool = False) -> bool:
+        status = self.done.get(os.path.abspath(path))
+        return status == "ok" or (status is not None and not retry_errors)
+
+    def record(self, path: str, error: Optional[str]) -> None:
+        entry = {"file": os.path.abspath(path), "status": "ok" if error is None else "error"}
+        if error is not None:
+            entry["error"] = error
+        self._fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._fh.flush()
+        self.done[entry["file"]] = entry["status"]
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+def run_batch(statements: Sequence[Tuple[str, str]], workers: int, chunk_size: int,
+              engine: Optional[str] = None, indent: bool = False) -> Iterator[Tuple[str, str, BatchResult]]:
+    """
+    Раздаёт выписки пулу из workers процессов порциями по chunk_size файлов.
+    Выдаёт (путь, относительное имя, итог) в исходном порядке файлов.
+
+    Если воркер аварийно завершился (BrokenProcessPool), пул пересоздаётся,
+    файлы прерванной порции разбираются заново по одному, без других задач
+    в пуле: файл, на котором воркер снова падает, получает ошибку, а
+    остальные порции отправляются в новый пул.
+    """
+    from parse_pool import _init_worker
+
+    def new_pool() -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+
+    chunks = chunked([(rel, path) for path, rel in statements], chunk_size)
+    executor = new_pool()
+    try:
+        futures = [executor.submit(parse_chunk, chunk, engine, indent) for chunk in chunks]
+        for i, chunk in enumerate(chunks):
+            try:
+                results = futures[i].result()
+            except BrokenProcessPool:
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor = new_pool()
+                results = []
+                for item in chunk:
+                    try:
+                        results.extend(executor.submit(parse_chunk, [item], engine, indent).result())
+                    except BrokenProcessPool:
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        executor = new_pool()
+                        results.append((item[0], None, "BrokenProcessPool: процесс-воркер аварийно завершился"))
+                # готовые результаты остаются, прерванные порции — в новый пул
+                futures[i + 1:] = [f if f.done() and not f.cancelled() and f.exception() is None
+                                   else executor.submit(parse_chunk, c, engine, indent)
+                                   for f, c in zip(futures[i + 1:], chunks[i + 1:])]
+            for (rel, path), result in zip(chunk, results):
+                yield path, rel, result
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def _write_file(out_dir: str, rel: str, body: bytes) -> str:
+    target = os.path.join(out_dir, os.path.splitext(rel)[0] + ".json")
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    write_atomic(target, body + b"\n")
+    return target
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    from reader import ENGINES
+
+    parser = argparse.ArgumentParser(description="Пакетный разбор брокерских выписок в JSON")
+    parser.add_argument("paths", nargs="+", help="файлы .xls/.xlsx и каталоги с ними")
+    parser.add_argument("--out-dir", default=None,
+                        help="по JSON-файлу на выписку в этот каталог (иначе — общий поток NDJSON)")
+    parser.add_argument("-o", "--output", default=None,
+                        help="файл общего потока (по умолчанию stdout)")
+    parser.add_argument("--manifest", default=None,
+                        help="журнал обработанных файлов: при повторном запуске они пропускаются")
+    parser.add_argument("--retry-errors", action="store_true",
+                        help="с --manifest: заново разбирать файлы, завершившиеся ошибкой")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="процессов-воркеров")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="файлов в порции воркера (по умолчанию — около четырёх порций на воркер)")
+    parser.add_argument("--engine", choices=ENGINES, default=None,
+                        help="движок чтения Excel (по умолчанию STATEMENT_READER_ENGINE или pandas)")
+    args = parser.parse_args(argv)
+
+    statements = collect_statements(args.paths)
+    if args.out_dir:
+        seen: Dict[str, str] = {}
+        for path, rel in statements:
+            if rel in seen:
+                parser.error(f"{path} и {seen[rel]} дают один и тот же файл результата {rel}")
+            seen[rel] = path
+    manifest = Manifest(args.manifest) if args.manifest else None
+    if manifest is not None:
+        pending = [(p, rel) for p, rel in statements if not manifest.completed(p, args.retry_errors)]
+        skipped, statements = len(statements) - len(pending), pending
+    else:
+        skipped = 0
+
+    out: Optional[BinaryIO] = None
+    if not args.out_dir:
+        # продолжение прогона дописывает общий поток, а не начинает его заново
+        out = open(args.output, "ab" if manifest is not None else "wb") if args.output else sys.stdout.buffer
+    chunk_size = args.chunk_size or default_chunk_size(len(statements), args.workers)
+    failed = 0
+    try:
+        for path, rel, (name, body, error) in run_batch(statements, args.workers, chunk_size,
+                                                        args.engine, indent=bool(args.out_dir)):
+            if error is not None:
+                failed += 1
+                print(f"{path}: {error}", file=sys.stderr)
+            if out is not None:
+                out.write(batch_record(name, body, error) + b"\n")
+                out.flush()
+            elif error is None:
+                _write_file(args.out_dir, rel, body)
+            if manifest is not None:
+                manifest.record(path, error)
+    finally:
+        if out is not None and out is not sys.stdout.buffer:
+            out.close()
+        if manifest is not None:
+            manifest.close()
+
+    print(f"разобрано {len(statements) - failed}, с ошибками {failed}, пропущено {skipped}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# benchmark.py
+#
+# Нагрузочный прогон парсеров на синтетических выписках (synthetic.py).
+# Каждый замер — в отдельном процессе, чтобы пиковый RSS относился
+# только к одному парсеру и одному размеру.
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Sequence
+
+from synthetic import generate_statement
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+#  Парсер -> (модуль, функция)
+TARGETS = {
+    "fin": ("fin_operations", "parse_financial_operations"),
+    "forex": ("forex_trades", "parse_forex_trades"),
+    "stocks": ("stocks_bounds", "parse_stock_bond_trades"),
+    "full": ("full_statement", "parse_full_statement"),
+    "lowmem": ("low_memory", "iter_operations"),
+}
+
+
+def _counts(target: str, rows: int) -> Dict[str, int]:
+    """
+    Размер секций выписки для замера: у парсера секции — rows строк,
+    у полной выписки rows делится поровну между тремя секциями.
+    """
+    if target in ("full", "lowmem"):
+        third, extra = divmod(rows, 3)
+        return {"cash_ops": third + extra, "fx_trades": third, "trades": third}
+    return {
+        "cash_ops": rows if target == "fin" else 0,
+        "fx_trades": rows if target == "forex" else 0,
+        "trades": rows if target == "stocks" else 0,
+    }
+
+
+def statement_path(workdir: str, target: str, rows: int, instruments: int, currencies: int, seed: int) -> str:
+    """
+    Синтетическая выписка для замера (генерируется один раз и переиспользуется).
+    """
+    counts = _counts(target, rows)
+    name = "synthetic-{cash_ops}-{fx_trades}-{trades}".format(**counts)
+    path = os.path.join(workdir, f"{name}-i{instruments}-c{currencies}-s{seed}.xlsx")
+    if not os.path.exists(path):
+        generate_statement(path, instruments=instruments, currencies=currencies, seed=seed, **counts)
+    return path
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss: килобайты в Linux, байты в macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _count(result) -> int:
+    ops = result.get("operations") if isinstance(result, dict) else result
+    if not hasattr(ops, "__len__"):
+        # генератор операций (low_memory): считаем, не сохраняя
+        return sum(1 for _ in ops)
+    return len(ops)
+
+
+def run_one(target: str, path: str, repeat: int) -> Dict[str, float]:
+    """
+    Замер в текущем процессе: лучшее время из repeat запусков и пиковый RSS.
+    """
+    module, name = TARGETS[target]
+    func = getattr(__import__(module), name)
+    rss_before = _peak_rss_mb()
+    best = float("inf")
+    operations = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        operations = _count(func(path))
+        best = min(best, time.perf_counter() - started)
+    return {"wall_s": best, "peak_rss_mb": _peak_rss_mb(), "import_rss_mb": rss_before,
+            "operations": operations}
+
+
+def _run_child(target: str, path: str, repeat: int, engine: Optional[str]) -> Dict[str, float]:
+    env = dict(os.environ)
+    if engine:
+        env["STATEMENT_READER_ENGINE"] = engine
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", target, path, "--repeat", str(repeat)],
+        check=True, capture_output=True, text=True, env=env,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def run(sizes: Sequence[int], targets: Sequence[str], workdir: str, repeat: int = 1,
+        instruments: int = 50, currencies: int = 3, seed: int = 0,
+        engine: Optional[str] = None) -> List[Dict[str, float]]:
+    """
+    Все замеры: для каждого размера и парсера — wall time, пиковый RSS, строк в секунду.
+    """
+    results = []
+    for rows in sizes:
+        for target in targets:
+            path = statement_path(workdir, target, rows, instruments, currencies, seed)
+            stats = _run_child(target, path, repeat, engine)
+            stats.update(target=target, rows=rows, rows_per_s=rows / stats["wall_s"] if stats["wall_s"] else 0.0)
+            results.append(stats)
+            print(f"{target:<7} {rows:>8} {stats['wall_s']:>9.3f} {stats['rows_per_s']:>11.0f} "
+                  f"{stats['peak_rss_mb']:>9.1f} {stats['operations']:>8}", flush=True)
+    return results
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк парсеров на синтетических выписках")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="строк в секции")
+    parser.add_argument("--targets", nargs="+", choices=list(TARGETS), default=list(TARGETS))
+    parser.add_argument("--repeat", type=int, default=1, help="запусков на замер (берётся лучший)")
+    parser.add_argument("--instruments", type=int, default=50)
+    parser.add_argument("--currencies", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--engine", choices=["pandas", "native"], help="движок чтения (reader.py)")
+    parser.add_argument("--workdir", help="каталог для сгенерированных выписок (по умолчанию — временный)")
+    parser.add_argument("--json", dest="json_path", help="сохранить результаты в JSON")
+    parser.add_argument("--child", nargs=2, metavar=("TARGET", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        target, path = args.child
+        print(json.dumps(run_one(target, path, args.repeat)))
+        return
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="statement-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    print(f"{'parser':<7} {'rows':>8} {'wall, s':>9} {'rows/s':>11} {'RSS, MB':>9} {'ops':>8}")
+    results = run(args.sizes, args.targets, workdir, args.repeat, args.instruments,
+                  args.currencies, args.seed, args.engine)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# classifier.py
+
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from constants import (
+    OPERATION_KEYWORD_TYPES,
+    OPERATION_TYPE_MAP,
+    SPECIAL_OPERATION_HANDLERS,
+    TICKER_ROW_KEYWORDS,
+    TOM_TICKER_PATTERN,
+    TOTAL_KEYWORD,
+)
+
+#  Регулярные выражения компилируются один раз при импорте
+ISIN_PATTERN = r"\b[A-Z]{2}[A-Z0-9]{10}\b"
+ISIN_RE = re.compile(ISIN_PATTERN)
+TICKER_ISIN_RE = re.compile(r"^(?P<ticker>\S+).*?ISIN[:\s]*(?P<isin>[A-Z0-9]{12})")
+TOM_TICKER_RE = re.compile(TOM_TICKER_PATTERN)
+TICKER_ROW_RE = re.compile("|".join(re.escape(k) for k in TICKER_ROW_KEYWORDS))
+TOTAL_ROW_RE = re.compile(re.escape(TOTAL_KEYWORD))
+
+#  Виды строк таблицы
+ROW_DATA = 0
+ROW_BLANK = 1
+ROW_HEADER = 2
+ROW_TOTAL = 3
+ROW_TICKER = 4
+
+OperationRule = Union[str, Callable[[Any, Any], str]]
+
+
+class OperationClassifier:
+    """
+    Определение типа операции по таблицам из constants:
+      keyword_types — подстрока в названии -> тип (порядок — приоритет),
+      handlers      — название -> функция (зачисление, списание) -> тип,
+      type_map      — название -> тип; остальное — "other".
+    Подстроки объединены в одно регулярное выражение, правило для каждого
+    различного названия вычисляется один раз (memo).
+    """
+
+    def __init__(self, keyword_types: Dict[str, str], handlers: Dict[str, Callable[[Any, Any], str]],
+                 type_map: Dict[str, str], cache_size: int = 4096):
+        self._keywords: List[Tuple[str, str]] = list(keyword_types.items())
+        self._priority = {k: i for i, (k, _) in enumerate(self._keywords)}
+        self._keyword_re = re.compile("|".join(re.escape(k) for k, _ in self._keywords)) if self._keywords else None
+        self._handlers = handlers
+        self._type_map = type_map
+        self.rule = lru_cache(maxsize=cache_size)(self._rule)
+
+    @classmethod
+    def from_constants(cls) -> "OperationClassifier":
+        return cls(OPERATION_KEYWORD_TYPES, SPECIAL_OPERATION_HANDLERS, OPERATION_TYPE_MAP)
+
+    def _rule(self, op: str) -> OperationRule:
+        if self._keyword_re is not None:
+            found = {m.group(0) for m in self._keyword_re.finditer(op.lower())}
+            if found:
+                keyword = min(found, key=self._priority.__getitem__)
+                return self._keywords[self._priority[keyword]][1]
+        if op in self._handlers:
+            return self._handlers[op]
+        return self._type_map.get(op, "other")
+
+    def classify(self, op: Any, inc: Any, exp: Any) -> str:
+        if not isinstance(op, str):
+            return "other"
+        rule = self.rule(op)
+        return rule if isinstance(rule, str) else rule(inc, exp)
+
+
+OPERATION_CLASSIFIER = OperationClassifier.from_constants()
+
+
+def _text_column(col: pd.Series) -> Optional[pd.Series]:
+    """
+    Строковый аксессор колонки или None, если в ней нет текста.
+    """
+    if col.dtype != object:
+        return None
+    try:
+        col.str
+    except AttributeError:
+        return None
+    return col
+
+
+def classify_rows(block: pd.DataFrame, header_keywords: Optional[List[str]] = None) -> np.ndarray:
+    """
+    Вид каждой строки таблицы за один проход по колонкам:
+      ROW_BLANK  — все ячейки пустые (или из пробелов),
+      ROW_HEADER — в ячейках строки есть все header_keywords (если заданы),
+      ROW_TOTAL  — есть текстовая ячейка, начинающаяся с «итого»,
+      ROW_TICKER — есть текстовая ячейка с «номер рег» или «isin»,
+      ROW_DATA   — остальные.
+    Приоритет — в порядке перечисления.
+    """
+    n = len(block)
+    blank = np.ones(n, dtype=bool)
+    total = np.zeros(n, dtype=bool)
+    ticker = np.zeros(n, dtype=bool)
+    header_hits = np.zeros((len(header_keywords or []), n), dtype=bool)
+
+    for _, col in block.items():
+        present = col.notna().to_numpy()
+        text = _text_column(col)
+        if text is None:
+            blank &= ~present
+            if header_keywords:
+                # числовые ячейки тоже участвуют в поиске заголовка (как str(c))
+                lower = col.astype(str).str.lower().where(col.notna())
+                for k, kw in enumerate(header_keywords):
+                    header_hits[k] |= lower.str.contains(kw, regex=False, na=False).to_numpy(dtype=bool)
+            continue
+        stripped = text.str.strip()
+        blank &= ~present | (stripped.notna().to_numpy() & (stripped == '').to_numpy())
+        lower = text.str.lower()
+        total |= lower.str.match(TOTAL_ROW_RE, na=False).to_numpy(dtype=bool)
+        ticker |= lower.str.contains(TICKER_ROW_RE, na=False).to_numpy(dtype=bool)
+        if header_keywords:
+            cells = col.astype(str).str.lower().where(col.notna())
+            for k, kw in enumerate(header_keywords):
+                header_hits[k] |= cells.str.contains(kw, regex=False, na=False).to_numpy(dtype=bool)
+
+    kinds = np.full(n, ROW_DATA, dtype=np.int8)
+    kinds[ticker] = ROW_TICKER
+    kinds[total] = ROW_TOTAL
+    if header_keywords:
+        kinds[header_hits.all(axis=0)] = ROW_HEADER
+    kinds[blank] = ROW_BLANK
+    return kinds
+
+
+def is_ticker_text(text: str) -> bool:
+    return TICKER_ROW_RE.search(text.lower()) is not None
+
+
+def parse_ticker_and_isin(text: str) -> Tuple[str, str]:
+    match = TICKER_ISIN_RE.search(text)
+    if match:
+        return match.group("ticker"), match.group("isin")
+    return "", ""
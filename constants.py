@@ -1,5 +1,9 @@
 from typing import Any
 
+#  Версия разбора выписки. Меняется при любом изменении результата парсеров,
+#  входит в ключ кэша результатов (result_cache.py)
+PARSER_VERSION = "1"
+
 #  Валидные операции, которые обрабатываются
 VALID_OPERATIONS = {
     "Вознаграждение компании",
@@ -42,6 +46,32 @@ SPECIAL_OPERATION_HANDLERS = {
     "НДФЛ": lambda i, e: "refund" if is_nonzero(i) else "withholding",
 }
 
+#  Операции, тип которых определяется по подстроке в названии (регистр не важен).
+#  Порядок — приоритет: первая найденная по списку подстрока задаёт тип
+OPERATION_KEYWORD_TYPES = {
+    "покупка": "buy",
+    "продажа": "sell",
+}
+
+#  Признаки строк внутри таблиц сделок (текст ячейки в нижнем регистре)
+TICKER_ROW_KEYWORDS = ["номер рег", "isin"]
+TOM_TICKER_PATTERN = r"[A-Z]{6,}_TOM"
+
+#  Якоря секций выписки (ищутся в тексте строки в нижнем регистре)
+CASH_HEADER_KEYWORDS = ["дата", "операция", "зачислен"]
+FOREX_BLOCK_ANCHOR = "иностранная валюта"
+FOREX_HEADER_KEYWORDS = ["дата", "номер", "время", "курс сделки", "объём в валюте", "объём в сопряж"]
+TRADES_BLOCK_ANCHOR = "2.1. сделки"
+TRADE_SECTION_KEYWORDS = {
+    "stock": ["акция", "адр"],
+    "bond": ["облигация"],
+}
+TRADE_HEADER_KEYWORDS = {
+    "stock": ["дата", "номер", "куплено", "продано", "сумма", "валюта", "дата соверш", "время соверш"],
+    "bond": ["совершена", "номер", "куплено", "продано", "сумма", "валюта", "нкд покупки", "нкд продажи"],
+}
+TOTAL_KEYWORD = "итого"
+
 HEADER_VARIATIONS_TRADES = {
     "stock": {
         "operation_id": ["номер", "Номер"],
@@ -0,0 +1,187 @@
+# dates.py
+
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import xlrd
+
+#  Форматы дат выписки: ДД.ММ.ГГГГ и ДД.ММ.ГГ
+DMY4 = "%d.%m.%Y"
+DMY2 = "%d.%m.%y"
+DATE_FORMATS: Tuple[str, ...] = (DMY4, DMY2)
+
+#  Размеры memo-кэшей: различных дат в выписке — сотни, времени — до суток в секундах
+DATE_CACHE_SIZE = 8192
+TIME_CACHE_SIZE = 1 << 17
+
+_DATE_PATTERNS = {
+    DMY4: re.compile(r"([0-9]{1,2})\.([0-9]{1,2})\.([0-9]{4})"),
+    DMY2: re.compile(r"([0-9]{1,2})\.([0-9]{1,2})\.([0-9]{2})"),
+}
+_TIME_PATTERN = re.compile(r"([0-9]{1,2}):([0-9]{1,2}):([0-9]{1,2})")
+
+
+def _iso_date(year: int, month: int, day: int) -> str:
+    # datetime() проверяет дату (31.02 -> ValueError)
+    date = datetime(year, month, day)
+    if year < 1000:
+        # strftime('%Y') не дополняет год нулями — повторяем его поведение
+        return date.strftime("%Y-%m-%d")
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_date_text(text: str, formats: Tuple[str, ...] = DATE_FORMATS) -> Optional[str]:
+    """
+    'ДД.ММ.ГГГГ' / 'ДД.ММ.ГГ' -> 'YYYY-MM-DD' или None. Форматы пробуются
+    по порядку, результат совпадает с datetime.strptime(text, fmt).
+    Быстрый путь — регулярное выражение и datetime() вместо strptime.
+    """
+    text = text.strip()
+    for fmt in formats:
+        match = _DATE_PATTERNS[fmt].fullmatch(text)
+        if match is None:
+            continue
+        day, month, year = map(int, match.groups())
+        if fmt == DMY2:
+            # как %y в strptime: 69–99 -> 19xx, 00–68 -> 20xx
+            year += 1900 if year >= 69 else 2000
+        try:
+            return _iso_date(year, month, day)
+        except ValueError:
+            continue
+    # необычная запись (например, « 1.07.2023» внутри) — штатным strptime
+    for fmt in formats:
+        try:
+            return datetime.strptime(text, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+
+@lru_cache(maxsize=TIME_CACHE_SIZE)
+def parse_time_text(text: str) -> Optional[str]:
+    """
+    'Ч:М:С' -> 'HH:MM:SS' или None, если запись другого вида.
+    """
+    match = _TIME_PATTERN.fullmatch(text.strip())
+    if match is None:
+        return None
+    hour, minute, second = map(int, match.groups())
+    if hour > 23 or minute > 59 or second > 59:
+        return None
+    return f"{hour:02d}:{minute:02d}:{second:02d}"
+
+
+def _parse_date_value(value: Any) -> Optional[str]:
+    if not value:
+        return None
+
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d")
+
+    if isinstance(value, (int, float)):
+        try:
+            date = datetime(*xlrd.xldate_as_tuple(value, 0))
+            return date.strftime("%Y-%m-%d")
+        except Exception:
+            return None
+
+    if isinstance(value, str):
+        return parse_date_text(value)
+
+    return None
+
+
+_parse_date_cached = lru_cache(maxsize=DATE_CACHE_SIZE, typed=True)(_parse_date_value)
+
+
+def parse_date(value: Any) -> Optional[str]:
+    """
+    Универсальный парсер даты.
+    Поддерживает:
+    - datetime.datetime
+    - Excel float/int дату (как в .xls)
+    - Строки в формате 'дд.мм.гггг' или 'дд.мм.гг'
+    Возвращает строку в формате 'YYYY-MM-DD' или None.
+    Результаты кэшируются (DATE_CACHE_SIZE значений).
+    """
+    try:
+        return _parse_date_cached(value)
+    except TypeError:
+        # нехешируемое значение
+        return _parse_date_value(value)
+
+
+def map_unique(func: Callable[[Any], Any], values: Union[pd.Series, Sequence]) -> np.ndarray:
+    """
+    Применяет func к каждому уникальному значению колонки (NaN — один раз)
+    и раскладывает результат обратно по строкам.
+    """
+    codes, uniques = pd.factorize(values if isinstance(values, pd.Series) else pd.Series(values, dtype=object))
+    table = np.empty(len(uniques) + 1, dtype=object)
+    for i, u in enumerate(uniques):
+        table[i] = func(u)
+    table[-1] = func(np.nan)
+    return table[codes]
+
+
+def parse_date_column(values: Union[pd.Series, Sequence]) -> np.ndarray:
+    """
+    parse_date для всей колонки: 'YYYY-MM-DD' или None.
+    """
+    return map_unique(parse_date, values)
+
+
+DateTimeFallback = Callable[[str, Optional[str], str], Optional[str]]
+
+
+def parse_datetime_columns(dates: pd.Series, times: Union[pd.Series, str],
+                           date_formats: Tuple[str, ...] = DATE_FORMATS,
+                           fallback: Optional[DateTimeFallback] = None,
+                           ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Склеивает текстовые колонки даты и времени в 'YYYY-MM-DD HH:MM:SS'.
+    Дата и время разбираются раздельно по фиксированным форматам: различных
+    значений у каждой колонки немного, и каждое разбирается один раз.
+    Строки, где быстрый путь не сработал, уходят в
+    fallback(текст даты, 'YYYY-MM-DD' или None, текст времени) —
+    по одному вызову на различную тройку.
+    Возвращает (datetimes, date_ok): строки/None и маску строк с распознанной датой.
+    """
+    day = map_unique(lambda t: parse_date_text(t, date_formats) if isinstance(t, str) else None, dates)
+    if isinstance(times, str):
+        clock = np.full(len(day), parse_time_text(times), dtype=object)
+        time_texts = np.full(len(day), times, dtype=object)
+    else:
+        clock = map_unique(lambda t: parse_time_text(t) if isinstance(t, str) else None, times)
+        time_texts = pd.Series(times, dtype=object).to_numpy()
+
+    date_ok = np.array([d is not None for d in day], dtype=bool)
+    fast = date_ok & np.array([c is not None for c in clock], dtype=bool)
+    result = np.empty(len(day), dtype=object)
+    result[fast] = [f"{d} {c}" for d, c in zip(day[fast], clock[fast])]
+
+    slow = np.flatnonzero(~fast)
+    if len(slow) and fallback is not None:
+        date_texts = pd.Series(dates, dtype=object).to_numpy()
+        memo = {}
+        for i in slow:
+            key = (date_texts[i], day[i], time_texts[i])
+            if key not in memo:
+                memo[key] = fallback(*key)
+            result[i] = memo[key]
+    return result, date_ok
+
+
+def format_timestamp(value: Any) -> Optional[str]:
+    """
+    Timestamp/datetime -> 'YYYY-MM-DD HH:MM:SS'; NaT/None -> None.
+    """
+    if value is None or pd.isna(value):
+        return None
+    return value.strftime("%Y-%m-%d %H:%M:%S")
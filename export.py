@@ -0,0 +1,131 @@
+# export.py
+
+from typing import Any, BinaryIO, Dict, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from OperationDTO import OPERATION_FIELDS, OperationBatch
+from constants import PARSER_VERSION
+
+EXPORT_FORMATS = ("parquet", "arrow", "csv")
+
+#  Колонки с небольшим числом различных значений — словарное кодирование
+CATEGORY_COLUMNS = ("operation_type", "currency", "ticker")
+#  quantity — тоже float64: у валютных сделок количество дробное, а тип
+#  колонки не должен зависеть от содержимого выписки
+FLOAT_COLUMNS = ("payment_sum", "price", "quantity", "aci")
+
+ExportTarget = Union[str, BinaryIO]
+
+
+def _numeric(values: Any, length: int) -> np.ndarray:
+    if not isinstance(values, np.ndarray):
+        values = np.full(length, values)
+    return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy(dtype=float)
+
+
+def operations_frame(operations: OperationBatch) -> pd.DataFrame:
+    """
+    Таблица операций с типизированными колонками:
+      date                             — datetime64 (timestamp),
+      payment_sum, price, quantity, aci — float64,
+      operation_type, currency, ticker  — category (в Arrow/Parquet — dictionary),
+      остальные                         — строки.
+    Типы не зависят от содержимого выписки (см. operations_schema).
+    """
+    n = len(operations)
+    columns: Dict[str, Any] = {}
+    for name in OPERATION_FIELDS:
+        value = operations.columns[name]
+        if name == "date":
+            columns[name] = pd.to_datetime(value if isinstance(value, np.ndarray) else [value] * n,
+                                           errors="coerce").astype("datetime64[s]")
+        elif name in FLOAT_COLUMNS:
+            columns[name] = _numeric(value, n)
+        else:
+            text = pd.Series(operations.column(name), dtype=object)
+            columns[name] = text.astype("category") if name in CATEGORY_COLUMNS else text
+    return pd.DataFrame(columns, index=pd.RangeIndex(n))
+
+
+def operations_schema():
+    """
+    Схема Arrow/Parquet таблицы операций — одна для всех выписок, чтобы
+    файлы разных выписок грузились в хранилище одной таблицей:
+    date — timestamp[ms] (секунд как единицы в Parquet нет: timestamp[s]
+    при записи стал бы [ms], и схемы Arrow и Parquet разошлись бы),
+    числа — float64, CATEGORY_COLUMNS — dictionary<int32, string> (ширина
+    индекса не зависит от числа значений), остальные — string.
+    Требует pyarrow.
+    """
+    import pyarrow as pa
+
+    def field_type(name: str):
+        if name == "date":
+            return pa.timestamp("ms")
+        if name in FLOAT_COLUMNS:
+            return pa.float64()
+        if name in CATEGORY_COLUMNS:
+            return pa.dictionary(pa.int32(), pa.string())
+        return pa.string()
+
+    return pa.schema([pa.field(name, field_type(name)) for name in OPERATION_FIELDS])
+
+
+def statement_metadata(result: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Метаданные счёта для file-level metadata (значения — строки, None -> "").
+    """
+    meta = {k: "" if v is None else str(v) for k, v in result.items() if k != "operations"}
+    meta["parser_version"] = PARSER_VERSION
+    return meta
+
+
+def statement_table(result: Dict[str, Any]):
+    """
+    pyarrow.Table операций; метаданные счёта — в метаданных схемы.
+    Требует pyarrow.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise ImportError("Для экспорта в Parquet/Arrow нужен пакет pyarrow") from e
+
+    ops = result["operations"]
+    if not isinstance(ops, OperationBatch):
+        ops = OperationBatch.from_columns(len(ops), **{f: [op.get(f) for op in ops] for f in OPERATION_FIELDS})
+    table = pa.Table.from_pandas(operations_frame(ops), schema=operations_schema(), preserve_index=False)
+    meta = {k.encode(): v.encode() for k, v in statement_metadata(result).items()}
+    return table.replace_schema_metadata({**(table.schema.metadata or {}), **meta})
+
+
+def export_statement(result: Dict[str, Any], target: ExportTarget, fmt: str = "parquet",
+                     compression: Optional[str] = None) -> None:
+    """
+    Записывает операции результата parse_full_statement(_batch) в target
+    (путь или бинарный файловый объект):
+      parquet — pyarrow.parquet (compression по умолчанию snappy),
+      arrow   — Arrow IPC file (Feather v2),
+      csv     — таблица операций без метаданных счёта (в CSV их негде хранить).
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат экспорта: {fmt}")
+
+    if fmt == "csv":
+        ops = result["operations"]
+        frame = operations_frame(ops) if isinstance(ops, OperationBatch) else pd.DataFrame(ops, columns=OPERATION_FIELDS)
+        if isinstance(frame["date"].dtype, np.dtype) and frame["date"].dtype.kind == "M":
+            frame["date"] = frame["date"].dt.strftime("%Y-%m-%d %H:%M:%S")
+        frame.to_csv(target, index=False, encoding="utf-8")
+        return
+
+    table = statement_table(result)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        pq.write_table(table, target, compression=compression or "snappy")
+    else:
+        import pyarrow as pa
+        options = pa.ipc.IpcWriteOptions(compression=compression) if compression else None
+        with pa.ipc.new_file(target, table.schema, options=options) as writer:
+            writer.write_table(table)
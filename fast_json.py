@@ -0,0 +1,196 @@
+# fast_json.py
+
+import json
+import math
+import os
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+# numpy and OperationDTO are imported on first use: the API imports this
+# module at startup, long before any statement has been parsed
+
+ENCODERS = ("auto", "orjson", "msgspec", "json")
+
+# Compact/indented encoders of one backend: obj -> bytes (indented may be None)
+Backend = Tuple[str, Callable[[Any], bytes], Optional[Callable[[Any], bytes]]]
+
+# Values every backend must render exactly like the stdlib before it is used
+_PROBE = {
+    "operations": [
+        {"date": "2023-07-03 00:00:00", "payment_sum": -1234.56, "quantity": 7, "price": 0.0001,
+         "aci": 9999999999999998.0, "comment": "Дивиденды «АФК Система»\t\"x\"/\\  \x1f"},
+        {"ticker": "", "isin": None, "flag": True, "neg": -0.0, "big": 2 ** 62, "nested": [[], {}]},
+    ],
+    "account_id": "328110",
+}
+
+
+def _stdlib_dumps(obj: Any, indent: bool = False, allow_nan: bool = False) -> bytes:
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2, allow_nan=allow_nan).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, allow_nan=allow_nan, separators=(",", ":")).encode("utf-8")
+
+
+def _load_backend(name: str) -> Optional[Backend]:
+    try:
+        if name == "orjson":
+            import orjson
+            return name, orjson.dumps, lambda obj: orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+        if name == "msgspec":
+            import msgspec
+            encoder = msgspec.json.Encoder()
+            return name, encoder.encode, None
+    except ImportError:
+        return None
+    return None
+
+
+def _verified(backend: Backend) -> Optional[Backend]:
+    """
+    Keeps only the encoders whose output is byte-identical to the stdlib on _PROBE.
+    """
+    name, compact, indented = backend
+    try:
+        if compact(_PROBE) != _stdlib_dumps(_PROBE):
+            return None
+        if indented is not None and indented(_PROBE) != _stdlib_dumps(_PROBE, indent=True):
+            indented = None
+    except Exception:
+        return None
+    return name, compact, indented
+
+
+_backend: Optional[Backend] = None
+_backend_resolved = False
+
+
+def get_backend() -> Optional[Backend]:
+    """
+    Fast backend selected by PARSER_JSON_ENCODER (auto|orjson|msgspec|json),
+    or None when only the stdlib encoder is available/allowed.
+    """
+    global _backend, _backend_resolved
+    if not _backend_resolved:
+        choice = os.environ.get("PARSER_JSON_ENCODER", "auto")
+        if choice not in ENCODERS:
+            raise ValueError(f"Unknown JSON encoder: {choice}")
+        names = ["orjson", "msgspec"] if choice == "auto" else [choice] if choice != "json" else []
+        for name in names:
+            backend = _load_backend(name)
+            if backend is not None:
+                _backend = _verified(backend)
+            if _backend is not None:
+                break
+        _backend_resolved = True
+    return _backend
+
+
+def backend_name() -> str:
+    backend = get_backend()
+    return backend[0] if backend else "json"
+
+
+def _is_unsafe_float(value: float) -> bool:
+    # The stdlib switches to exponent notation (1e-05, 1e+16) outside
+    # [1e-4, 1e16) and writes NaN/Infinity; fast encoders differ there
+    return not math.isfinite(value) or (value != 0 and not 1e-4 <= abs(value) < 1e16)
+
+
+def _is_safe(obj: Any) -> bool:
+    """
+    True when a fast encoder renders obj exactly like the stdlib.
+    """
+    if isinstance(obj, float):
+        return not _is_unsafe_float(obj)
+    if isinstance(obj, str) or obj is None or isinstance(obj, bool):
+        return True
+    if isinstance(obj, int):
+        return -2 ** 63 <= obj < 2 ** 64
+    if isinstance(obj, dict):
+        return all(isinstance(k, str) and _is_safe(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return all(_is_safe(v) for v in obj)
+    return False
+
+
+_PLAIN_TYPES = {str, type(None), bool}
+
+
+def _batch_is_safe(batch) -> bool:
+    """
+    Vectorized _is_safe over the numeric columns of an OperationBatch.
+    """
+    import numpy as np
+
+    for value in batch.columns.values():
+        if not isinstance(value, np.ndarray):
+            if not _is_safe(value):
+                return False
+        elif value.dtype.kind == "f":
+            magnitude = np.abs(value)
+            if not (np.isfinite(value).all() and ((magnitude == 0) | ((magnitude >= 1e-4) & (magnitude < 1e16))).all()):
+                return False
+        elif value.dtype == object:
+            values = value.tolist()
+            # text columns: one pass in C over the value types
+            if not set(map(type, values)) <= _PLAIN_TYPES and not all(_is_safe(v) for v in values):
+                return False
+    return True
+
+
+def _encode(encode: Callable[[Any], bytes], obj: Any, indent: bool, allow_nan: bool) -> bytes:
+    try:
+        return encode(obj)
+    except TypeError:
+        # types the fast encoder does not know (float/int subclasses etc.)
+        return _stdlib_dumps(obj, indent, allow_nan)
+
+
+def dumps(obj: Any, indent: bool = False, allow_nan: bool = False) -> bytes:
+    """
+    UTF-8 JSON identical to json.dumps(obj, ensure_ascii=False, ...) — compact
+    (separators without spaces) or with indent=2 — through orjson/msgspec
+    when installed and the value is safe for them.
+    """
+    backend = get_backend()
+    encode = None if backend is None else backend[2] if indent else backend[1]
+    if encode is not None and _is_safe(obj):
+        return _encode(encode, obj, indent, allow_nan)
+    return _stdlib_dumps(obj, indent, allow_nan)
+
+
+def encode_statement(result: Dict[str, Any], indent: bool = False, allow_nan: bool = False) -> bytes:
+    """
+    Statement result whose operations may be an OperationBatch. The safety
+    check runs over the batch columns instead of every row.
+    """
+    from OperationDTO import OperationBatch
+
+    ops = result.get("operations")
+    if not isinstance(ops, OperationBatch):
+        return dumps(result, indent, allow_nan)
+    doc = {**result, "operations": ops.to_dicts()}
+    backend = get_backend()
+    encode = None if backend is None else backend[2] if indent else backend[1]
+    header = {k: v for k, v in result.items() if k != "operations"}
+    if encode is not None and _is_safe(header) and _batch_is_safe(ops):
+        return _encode(encode, doc, indent, allow_nan)
+    return _stdlib_dumps(doc, indent, allow_nan)
+
+
+def iter_ndjson(result: Dict[str, Any]) -> Iterator[bytes]:
+    """
+    NDJSON lines of a statement result: metadata first, then one operation per line.
+    """
+    from OperationDTO import OperationBatch
+
+    header = {k: v for k, v in result.items() if k != "operations"}
+    yield dumps(header, allow_nan=True) + b"\n"
+    ops = result.get("operations", [])
+    backend = get_backend()
+    if backend is not None and isinstance(ops, OperationBatch) and _batch_is_safe(ops):
+        encode = backend[1]
+        for record in ops:
+            yield _encode(encode, record, False, True) + b"\n"
+    else:
+        for record in ops:
+            yield dumps(record, allow_nan=True) + b"\n"
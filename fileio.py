@@ -0,0 +1,31 @@
+# fileio.py
+
+import json
+import os
+import tempfile
+from typing import Any, Optional
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    """
+    Write data to path through a temp file in the same directory and
+    os.replace, so a concurrent reader sees the old file or the new one,
+    never a partial write.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def read_json(path: str) -> Optional[Any]:
+    """The parsed JSON file at path, or None when it does not exist."""
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return None
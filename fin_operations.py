@@ -1,42 +1,97 @@
 import json
 
+import numpy as np
 import pandas as pd
 import re
-from OperationDTO import OperationDTO
+from OperationDTO import OperationBatch
+from classifier import ISIN_PATTERN
 from constants import (
-    CURRENCY_DICT,
     SKIP_OPERATIONS,
-    VALID_OPERATIONS, is_nonzero,
+    VALID_OPERATIONS,
 )
-from utils import parse_date, parse_header_data, to_num, extract_isin, detect_operation_type
-
-
-def parse_financial_operations(file_path: str) -> dict:
-    # 1) Читаем весь лист как строки
-    df = pd.read_excel(file_path, header=None, dtype=str)
-
-    # 2) Склеиваем каждую строку для удобного поиска
-    df['_row_txt'] = df.fillna('').agg(' '.join, axis=1).str.strip()
-
-    # 3) Находим и «разливаем» валюту
-    mask_cur = df['_row_txt'].isin(k for k in CURRENCY_DICT)
-    df.loc[mask_cur, '_currency'] = df.loc[mask_cur, '_row_txt'].map(
-        lambda x: CURRENCY_DICT.get(x, x)
+from utils import (
+    detect_operation_type,
+    is_nonzero_column,
+    parse_header_data,
+    to_num_column,
+)
+from dates import parse_date_column
+from layout import ColumnRule, LayoutSpec, resolve_layout
+from workbook import StatementSource, load_statement
+
+#  Колонки таблицы операций по счёту
+CASH_LAYOUT = LayoutSpec("cash", {
+    "date":    ColumnRule(("дата",)),
+    "op":      ColumnRule(("операция",)),
+    "inc":     ColumnRule(("зачислен",)),
+    "exp":     ColumnRule(("списани",)),
+    "comment": ColumnRule(("примеч",), alternatives=(("коммент",),), required=False),
+})
+
+
+def _build_operations(data: pd.DataFrame, ops: pd.Series, dates: np.ndarray,
+                      currency: np.ndarray, ci: dict) -> OperationBatch:
+    """
+    Колоночная сборка операций по уже отфильтрованным строкам блока.
+    """
+    inc = data.iloc[:, ci["inc"]]
+    exp = data.iloc[:, ci["exp"]]
+    payment = np.where(is_nonzero_column(inc), to_num_column(inc), to_num_column(exp))
+
+    if ci["comment"] is not None:
+        raw_comment = data.iloc[:, ci["comment"]]
+        comment_str = raw_comment.astype(str)
+        comments = comment_str.str.strip().where(raw_comment.notna() & (comment_str.str.lower() != "nan"), "")
+    else:
+        comments = pd.Series("", index=data.index)
+    isins = comments.str.extract(f"({ISIN_PATTERN})", expand=False).fillna("")
+
+    # тип зависит от (операция, зачисление, списание) — считаем по уникальным тройкам
+    codes, triples = pd.MultiIndex.from_arrays([ops, inc, exp]).factorize()
+    op_types = np.array([detect_operation_type(o, i, e) for o, i, e in triples], dtype=object)[codes]
+
+    return OperationBatch.from_columns(
+        len(data),
+        date=[d + " 00:00:00" for d in dates],
+        operation_type=op_types,
+        payment_sum=payment,
+        currency=currency,
+        isin=isins,
+        comment=comments,
     )
-    df['_currency'] = df['_currency'].ffill().fillna('RUB')
 
-    # 4) Ищем индекс строки-заголовка таблицы операций
-    header_mask = (
-        df['_row_txt'].str.lower().str.contains('дата') &
-        df['_row_txt'].str.lower().str.contains('операция') &
-        df['_row_txt'].str.lower().str.contains('зачислен')
-    )
-    hdr_idxs = df.index[header_mask]
-    if hdr_idxs.empty:
-        return {"account_id": None, "account_date_start": None, "date_start": None, "date_end": None, "operations": []}
-    hdr_i = hdr_idxs[0]
 
-    # 5) Парсим header_data из строк до hdr_i
+def parse_financial_operations(file_path: StatementSource) -> dict:
+    """
+    Метаданные счёта и список операций по счёту (словари формата OperationDTO.to_dict()),
+    упорядоченный по дате; операции одного дня — в порядке выписки.
+    """
+    result = parse_financial_operations_batch(file_path)
+    result["operations"] = result["operations"].to_dicts()
+    return result
+
+
+def parse_financial_operations_batch(file_path: StatementSource) -> dict:
+    """
+    То же, что parse_financial_operations, но операции — OperationBatch.
+    """
+    workbook = load_statement(file_path)
+    df = workbook.text
+    index = workbook.sections
+
+    # 1) Строка-заголовок таблицы операций (из индекса секций)
+    hdr_i = index.cash_header
+    if hdr_i is None:
+        return {"account_id": None, "account_date_start": None, "date_start": None, "date_end": None,
+                "operations": OperationBatch.empty()}
+
+    # 2) «Разливаем» валюту от строк-маркеров вниз по листу
+    marks = np.array(sorted(index.currency_rows), dtype=int)
+    marked = np.array([index.currency_rows[m] for m in marks] + ["RUB"], dtype=object)
+    last_mark = np.searchsorted(marks, np.arange(len(df)), side="right") - 1
+    currency = marked[last_mark]
+
+    # 3) Парсим header_data из строк до hdr_i
     header_data = {
         "account_id": None,
         "account_date_start": None,
@@ -45,79 +100,39 @@ def parse_financial_operations(file_path: str) -> dict:
         "unknown_operations": []
     }
     for _, raw_row in df.iloc[:hdr_i].iterrows():
-        # отбрасываем наши технические колонки
-        # и склеиваем всё обратно в единый текст
-        vals = [c for c in raw_row[:-2] if pd.notna(c)]
+        vals = [c for c in raw_row if pd.notna(c)]
         row_str = " ".join(str(c).strip() for c in vals)
         parse_header_data(row_str, header_data)
 
-    # 6) Собираем сам блок операций
-    block = df.iloc[hdr_i:].reset_index(drop=True)
-    headers = block.iloc[0].fillna('').astype(str).str.lower()
-
-    def col(*keys):
-        for i, h in enumerate(headers):
-            if all(k in h for k in keys):
-                return i
-        return None
-
-    ci = {
-        "date":    col("дата"),
-        "op":      col("операция"),
-        "inc":     col("зачислен"),
-        "exp":     col("списани"),
-        "comment": col("примеч") or col("коммент")
-    }
-
-    data = block.iloc[1:].copy()
-    data['_txt'] = data.fillna('').agg(' '.join, axis=1).str.lower()
-    data = data[~data['_txt'].str.contains('итого')]
-
-    # 7) Проходим по строкам и собираем DTO
-    operations = []
-    for _, row in data.iterrows():
-        op_raw = str(row.iat[ci["op"]] or "").strip()
-        if not op_raw or op_raw in SKIP_OPERATIONS or op_raw not in VALID_OPERATIONS:
-            header_data["unknown_operations"].append(op_raw)
-            continue
-
-        dt = parse_date(row.iat[ci["date"]])
-        if not dt:
-            continue
-
-        inc = row.iat[ci["inc"]] or ""
-        exp = row.iat[ci["exp"]] or ""
-        payment = to_num(inc if is_nonzero(inc) else exp)
-
-        raw_comment = row.iat[ci["comment"]]
-        comment = "" if pd.isna(raw_comment) or str(raw_comment).lower() == "nan" else str(raw_comment).strip()
-        isin = extract_isin(comment)
-
-        op_type = detect_operation_type(op_raw, inc, exp)
-        currency = row['_currency']
-
-        dto = OperationDTO(
-            date=dt,
-            operation_type=op_type,
-            payment_sum=payment,
-            currency=currency,
-            ticker="",
-            isin=isin,
-            price=0.0,
-            quantity=0,
-            aci=0.0,
-            comment=comment,
-            operation_id=""
-        )
-        operations.append(dto)
-
-    # 8) Формируем итоговый словарь
+    # 4) Индексы колонок по строке-заголовку (раскладка шаблона кэшируется)
+    ci = resolve_layout(CASH_LAYOUT, df.iloc[hdr_i]).columns
+
+    # 5) Строки блока без «итого»
+    rows = np.arange(hdr_i + 1, len(df))
+    rows = rows[~np.isin(rows, list(index.totals))]
+    data = df.iloc[rows]
+    currency = currency[rows]
+
+    # 6) Колоночная обработка: фильтр операций, даты, суммы, ISIN, типы
+    ops = data.iloc[:, ci["op"]].astype(str).str.strip()
+    valid = (ops.isin(VALID_OPERATIONS) & ~ops.isin(SKIP_OPERATIONS)).to_numpy()
+    header_data["unknown_operations"].extend(ops[~valid].tolist())
+
+    dates = parse_date_column(data.iloc[:, ci["date"]])
+    keep = valid & pd.notna(dates)
+    if keep.any():
+        # блоки валют идут друг за другом — упорядочиваем по дате (устойчиво)
+        operations = _build_operations(data[keep], ops[keep], dates[keep], currency[keep], ci).sort_by_date()
+    else:
+        operations = OperationBatch.empty()
+
+    # 7) Формируем итоговый словарь
     return {
         "account_id": header_data.get("account_id"),
         "account_date_start": header_data.get("account_date_start"),
         "date_start": header_data.get("date_start"),
         "date_end": header_data.get("date_end"),
-        "operations": [o.to_dict() for o in operations],
+        "operations": operations,
     }
 
 
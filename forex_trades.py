@@ -1,132 +1,150 @@
+import numpy as np
 import pandas as pd
-import re
 import json
-from OperationDTO import OperationDTO
-from utils import to_num, find_column_index
-
-REQUIRED_COLUMNS = ["дата", "номер", "время", "курс сделки", "объём в валюте", "объём в сопряж"]
+from typing import Optional
+
+from OperationDTO import OperationBatch
+from classifier import TOM_TICKER_RE
+from constants import FOREX_HEADER_KEYWORDS, HEADER_VARIATIONS_TRADES
+from dates import DMY2, format_timestamp, parse_date_text, parse_datetime_columns
+from layout import ColumnRule, LayoutSpec, resolve_layout
+from utils import to_num_column
+from workbook import StatementSource, load_statement
+
+REQUIRED_COLUMNS = FOREX_HEADER_KEYWORDS
+
+#  Колонки таблицы сделок с валютой; покупка и продажа — первая и вторая
+#  из одинаково названных колонок объёма
+FOREX_LAYOUT = LayoutSpec("currency", {
+    "number":     ColumnRule(("номер",), variation="operation_id", required=False),
+    "buy_price":  ColumnRule(("курс", "покупка"), variation="buy_price"),
+    "sell_price": ColumnRule(("курс", "продажа"), variation="sell_price"),
+    "buy_qty":    ColumnRule(("объём в валюте",), variation="buy_quantity"),
+    "sell_qty":   ColumnRule(("объём в валюте",), occurrence=1, variation="sell_quantity"),
+    "buy_sum":    ColumnRule(("объём в сопряж",), variation="buy_payment"),
+    "sell_sum":   ColumnRule(("объём в сопряж",), occurrence=1, variation="sell_payment"),
+    "exec_date":  ColumnRule(("дата", "соверш"), variation="date"),
+    "exec_time":  ColumnRule(("время", "соверш"), variation="time", required=False),
+}, HEADER_VARIATIONS_TRADES["currency"])
 
 
 def parse_date_cell(cell):
-    try:
-        return pd.to_datetime(str(cell).strip(), format="%d.%m.%y")
-    except:
-        return pd.NaT
-
-def parse_forex_trades(file_path):
-    df = pd.read_excel(file_path, header=None)
-    results = []
-
-    # 1) начало блока
-    start_idx = None
-    for i, row in df.iterrows():
-        txt = " ".join(str(c).lower() for c in row if pd.notna(c))
-        if "иностранная валюта" in txt:
-            start_idx = i + 1
-            break
-    if start_idx is None:
-        return []
-
-    df_block = df.iloc[start_idx:].reset_index(drop=True)
-
-    # 2) строка заголовков
-    header_row = None
-    for i, row in df_block.iterrows():
-        txt = " ".join(str(c).lower() for c in row if pd.notna(c))
-        if all(key in txt for key in REQUIRED_COLUMNS):
-            header_row = i
-            break
-    if header_row is None:
-        return []
-
-    headers = df_block.iloc[header_row].astype(str).str.lower()
-
-    # 3) индексы колонок
-    col_number     = find_column_index(headers, "номер")
-    col_buy_price  = find_column_index(headers, "курс", "покупка")
-    col_sell_price = find_column_index(headers, "курс", "продажа")
-    qty_cols       = [i for i,h in enumerate(headers) if "объём в валюте" in h]
-    sum_cols       = [i for i,h in enumerate(headers) if "объём в сопряж" in h]
-    col_buy_qty, col_sell_qty = (qty_cols + [None, None])[:2]
-    col_buy_sum, col_sell_sum = (sum_cols + [None, None])[:2]
-    col_exec_date  = find_column_index(headers, "дата", "соверш")
-    col_exec_time  = find_column_index(headers, "время", "соверш")
-
-    current_ticker  = ""
-    current_currency = ""
-    i = header_row + 1
-
-    while i < len(df_block):
-        row = df_block.iloc[i]
-
-        # ► Пропускаем любые строки с "итого"
-        if row.astype(str).str.lower().str.contains("итого").any():
-            i += 1
+    date = parse_date_text(str(cell), (DMY2,))
+    return pd.Timestamp(date) if date else pd.NaT
+
+
+def _first_matching_column(block: pd.DataFrame, match) -> np.ndarray:
+    """
+    Для каждой строки — номер первой текстовой колонки, где match(col) истинно, иначе -1.
+    """
+    first = np.full(len(block), -1)
+    for j in range(block.shape[1] - 1, -1, -1):
+        col = block.iloc[:, j]
+        if col.dtype != object:
             continue
-
-        # ► Строка с новым тикером?
-        ticker_cell = None
-        for j, cell in enumerate(row):
-            if isinstance(cell, str) and re.fullmatch(r"[A-Z]{6,}_TOM", cell.strip()):
-                ticker_cell = (j, cell.strip())
-                break
-        if ticker_cell:
-            raw = ticker_cell[1]
-            current_ticker = raw.split("+")[0][:6]
-            info = df_block.iloc[i].astype(str)
-            idx = next((k for k,v in enumerate(info) if "сопряж. валюта:" in v.lower()), None)
-            current_currency = info.iat[idx+2].strip() if idx and idx+2 < len(info) else ""
-            i += 1
+        try:
+            hit = match(col).to_numpy(dtype=bool)
+        except AttributeError:
             continue
-
-        # ► Пустая строка = конец
-        if all(pd.isna(c) or str(c).strip()=="" for c in row):
-            break
-
-        # ► Обработка операции
-        raw_date = row.iat[col_exec_date] if col_exec_date is not None else None
-        raw_time = row.iat[col_exec_time] if col_exec_time is not None else None
-
-        date_obj = parse_date_cell(raw_date)
-        time_str = str(raw_time).strip() if pd.notna(raw_time) else "00:00:00"
-
-        # поле `date_obj` гарантированно валидно (итого-строки мы уже отбросили)
-        dt = pd.to_datetime(f"{date_obj.strftime('%Y-%m-%d')} {time_str}")
-        date_str = dt.strftime("%Y-%m-%d %H:%M:%S")
-
-        number = str(row.iat[col_number]).strip() if col_number is not None else ""
-
-        bp = row.iat[col_buy_price]  if col_buy_price  is not None else None
-        sp = row.iat[col_sell_price] if col_sell_price is not None else None
-
-        if pd.notna(bp):
-            op    = "currency_buy"
-            price = to_num(bp)
-            qty   = row.iat[col_buy_qty]
-            sm    = row.iat[col_buy_sum]
-        else:
-            op    = "currency_sale"
-            price = to_num(sp)
-            qty   = row.iat[col_sell_qty]
-            sm    = row.iat[col_sell_sum]
-
-        dto = OperationDTO(
-            date=date_str,
-            operation_type=op,
-            payment_sum=to_num(sm),
-            currency=current_currency,
-            ticker=current_ticker,
-            isin="",
-            price=price,
-            quantity=to_num(qty),
-            aci=0.0,
-            comment="",
-            operation_id=number
-        )
-        results.append(dto.to_dict())
-        i += 1
-
-    return results
+        first[hit] = j
+    return first
+
+
+def _exec_datetime_fallback(_: str, date: Optional[str], time_text: str) -> Optional[str]:
+    # время не в виде ЧЧ:ММ:СС — общий разбор «YYYY-MM-DD <время>», как раньше
+    if date is None:
+        return None
+    return format_timestamp(pd.to_datetime(f"{date} {time_text}"))
+
+def parse_forex_trades(file_path: StatementSource):
+    return parse_forex_trades_batch(file_path).to_dicts()
+
+def parse_forex_trades_batch(file_path: StatementSource) -> OperationBatch:
+    workbook = load_statement(file_path)
+    df = workbook.raw
+    index = workbook.sections
+
+    # 1) начало блока и 2) строка заголовков — из индекса секций
+    if index.forex_start is None or index.forex_header is None:
+        return OperationBatch.empty()
+    header_row = index.forex_header
+
+    # 3) строки блока: от заголовка до первой пустой строки
+    start = header_row + 1
+    stop = index.next_blank(start, len(df))
+    body = df.iloc[start:stop]
+    total = np.isin(np.arange(start, stop), list(index.totals))
+
+    # ► строки с тикером (…_TOM) и сопряжённой валютой — колоночными операциями
+    ticker_col = _first_matching_column(
+        body, lambda col: col.str.strip().str.fullmatch(TOM_TICKER_RE, na=False)
+    )
+    quote_col = _first_matching_column(
+        body, lambda col: col.str.lower().str.contains("сопряж. валюта:", regex=False, na=False)
+    )
+    is_ticker = (ticker_col >= 0) & ~total
+
+    values = body.to_numpy(dtype=object)
+    n_cols = values.shape[1]
+    tickers = pd.Series(np.nan, index=range(len(body)), dtype=object)
+    currencies = pd.Series(np.nan, index=range(len(body)), dtype=object)
+    for pos in np.flatnonzero(is_ticker):
+        tickers.iat[pos] = values[pos, ticker_col[pos]].strip().split("+")[0][:6]
+        q = quote_col[pos]
+        currencies.iat[pos] = str(values[pos, q + 2]).strip() if q > 0 and q + 2 < n_cols else ""
+    tickers = tickers.ffill().fillna("").to_numpy()
+    currencies = currencies.ffill().fillna("").to_numpy()
+
+    trades = ~(total | is_ticker)
+    data = body[trades]
+    if data.empty:
+        return OperationBatch.empty()
+
+    # 4) индексы колонок (раскладка шаблона кэшируется по отпечатку заголовков)
+    ci = resolve_layout(FOREX_LAYOUT, df.iloc[header_row]).columns
+    col_number, col_exec_date, col_exec_time = ci["number"], ci["exec_date"], ci["exec_time"]
+    col_buy_price, col_sell_price = ci["buy_price"], ci["sell_price"]
+    col_buy_qty, col_sell_qty = ci["buy_qty"], ci["sell_qty"]
+    col_buy_sum, col_sell_sum = ci["buy_sum"], ci["sell_sum"]
+
+    def column(col_idx):
+        if col_idx is None:
+            return pd.Series(np.nan, index=data.index, dtype=object)
+        return data.iloc[:, col_idx]
+
+    # ► дата (строго ДД.ММ.ГГ) и время исполнения — по разу на различное значение
+    raw_time = column(col_exec_time)
+    times = raw_time.astype(str).str.strip().where(raw_time.notna(), "00:00:00")
+    date_str, date_ok = parse_datetime_columns(
+        column(col_exec_date).astype(str), times, (DMY2,), fallback=_exec_datetime_fallback
+    )
+    if not date_ok.all():
+        bad = data.index[~date_ok][0]
+        raise ValueError(f"Не удалось разобрать дату сделки в строке {bad}")
+
+    # ► покупка, если заполнен курс покупки, иначе продажа
+    is_buy = column(col_buy_price).notna().to_numpy()
+
+    def pick(buy_idx, sell_idx):
+        return np.where(is_buy, to_num_column(column(buy_idx)), to_num_column(column(sell_idx)))
+
+    number = column(col_number).astype(str).str.strip() if col_number is not None else ""
+
+    # сделки сгруппированы по валютным парам — упорядочиваем по дате (устойчиво)
+    return OperationBatch.from_columns(
+        len(data),
+        date=date_str,
+        operation_type=np.where(is_buy, "currency_buy", "currency_sale").astype(object),
+        payment_sum=pick(col_buy_sum, col_sell_sum),
+        currency=currencies[trades],
+        ticker=tickers[trades],
+        isin="",
+        price=pick(col_buy_price, col_sell_price),
+        quantity=pick(col_buy_qty, col_sell_qty),
+        aci=0.0,
+        comment="",
+        operation_id=number,
+    ).sort_by_date()
 
 if __name__ == "__main__":
     trades = parse_forex_trades("pensil.XLSX")
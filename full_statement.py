@@ -1,12 +1,36 @@
 # full_statement.py
 
-import json
-from typing import List, Dict, Any
+import os
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Iterator, Optional, Tuple
 
+import pandas as pd
+
+from OperationDTO    import OperationBatch
 from constants import CURRENCY_DICT
-from fin_operations import parse_financial_operations
-from forex_trades    import parse_forex_trades
-from stocks_bounds   import parse_stock_bond_trades
+from metrics         import NULL_TIMINGS, StageTimings
+from fin_operations import parse_financial_operations_batch
+from forex_trades    import parse_forex_trades_batch
+from stocks_bounds   import parse_stock_bond_trades_batch
+from workbook        import StatementSource, StatementWorkbook, load_statement
+
+#  Режимы разбора секций: по очереди, потоками (есть смысл на сборках без GIL),
+#  процессами (каждому — только его строки листа) или auto
+SECTION_MODES = ("serial", "threads", "processes", "auto")
+DEFAULT_SECTION_MODE = os.environ.get("PARSER_SECTIONS", "serial")
+#  auto с GIL: листы от стольких строк разбираются процессами, меньшие — по очереди
+PROCESS_MIN_ROWS = 20000
+
+SECTION_PARSERS = {
+    "fin": parse_financial_operations_batch,
+    "forex": parse_forex_trades_batch,
+    "stocks": parse_stock_bond_trades_batch,
+}
+
+_executors: Dict[str, Executor] = {}
 
 def normalize_currency(op: Dict[str, Any]) -> None:
     """
@@ -16,7 +40,7 @@ def normalize_currency(op: Dict[str, Any]) -> None:
     cur = op.get("currency", "")
     op["currency"] = CURRENCY_DICT.get(cur, cur)
 
-def parse_full_statement(file_path: str) -> Dict[str, Any]:
+def parse_full_statement(file_path: StatementSource, engine: Optional[str] = None) -> Dict[str, Any]:
     """
     Собирает:
       1) Финансовые операции по счёту
@@ -24,41 +48,293 @@ def parse_full_statement(file_path: str) -> Dict[str, Any]:
       3) Сделки с акциями и облигациями
     Приводит currency через CURRENCY_DICT и возвращает единый словарь
     с метаданными и отсортированным по дате списком операций.
+    Файл читается один раз (engine: "pandas" или "native", см. reader.py),
+    все парсеры секций работают с общим листом.
+    """
+    return statement_to_dict(parse_full_statement_batch(file_path, engine))
+
+def _gil_disabled() -> bool:
+    is_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_enabled is not None and not is_enabled()
+
+def resolve_section_mode(mode: Optional[str], rows: int) -> str:
+    """
+    Режим разбора секций для листа из rows строк (None — PARSER_SECTIONS).
+    auto: потоки на сборке без GIL, иначе процессы для больших листов.
+    """
+    mode = mode or DEFAULT_SECTION_MODE
+    if mode not in SECTION_MODES:
+        raise ValueError(f"Неизвестный режим разбора секций: {mode}")
+    if mode == "auto":
+        if _gil_disabled():
+            return "threads"
+        return "processes" if rows >= PROCESS_MIN_ROWS else "serial"
+    return mode
+
+def section_rows(workbook: StatementWorkbook) -> Dict[str, int]:
+    """
+    Число строк листа в каждой секции (для метрик и прогресса задач):
+      fin    — от начала листа до первого из якорей валюты и сделок,
+      forex  — от якоря «Иностранная валюта» до пустой строки после таблицы,
+      stocks — от якоря «2.1. Сделки» до конца листа.
+    """
+    total = len(workbook.raw)
+    index = workbook.sections
+    rows = {"forex": 0, "stocks": 0}
+    if index.forex_start is not None and index.forex_header is not None:
+        rows["forex"] = index.next_blank(index.forex_header + 1, total) - (index.forex_start - 1)
+    if index.trades_start is not None:
+        rows["stocks"] = total - (index.trades_start - 1)
+    anchors = [a - 1 for a in (index.forex_start, index.trades_start) if a is not None]
+    rows["fin"] = min(anchors, default=total)
+    return {name: rows[name] for name in SECTION_PARSERS}
+
+def section_frames(workbook: StatementWorkbook) -> Dict[str, Any]:
+    """
+    Строки листа, которых достаточно каждому парсеру секции:
+      fin    — весь лист (метаданные сверху, блок операций до конца листа)
+               вместе с готовым индексом секций,
+      forex  — от якоря «Иностранная валюта» до пустой строки после таблицы,
+      stocks — от якоря «2.1. Сделки» до конца листа.
+    Разбор такого фрагмента даёт тот же результат, что и разбор всего листа.
+    """
+    raw = workbook.raw
+    index = workbook.sections
+    frames = {"fin": StatementWorkbook(raw, sections=index), "forex": raw.iloc[:0], "stocks": raw.iloc[:0]}
+    if index.forex_start is not None and index.forex_header is not None:
+        frames["forex"] = raw.iloc[index.forex_start - 1:index.next_blank(index.forex_header + 1, len(raw))]
+    if index.trades_start is not None:
+        frames["stocks"] = raw.iloc[index.trades_start - 1:]
+    return frames
+
+def _parse_section(name: str, source: Any) -> Tuple[Any, float]:
+    # source — StatementWorkbook или фрагмент листа (DataFrame)
+    if isinstance(source, pd.DataFrame):
+        source = StatementWorkbook(source)
+    started = time.perf_counter()
+    result = SECTION_PARSERS[name](source)
+    return result, time.perf_counter() - started
+
+def _executor(mode: str) -> Executor:
+    executor = _executors.get(mode)
+    if executor is None:
+        cls = ThreadPoolExecutor if mode == "threads" else ProcessPoolExecutor
+        executor = _executors[mode] = cls(max_workers=len(SECTION_PARSERS))
+    return executor
+
+def _drop_executor(mode: str, executor: Executor) -> None:
+    # пул с умершим процессом задач больше не принимает: следующий вызов
+    # _executor() создаст новый
+    if _executors.get(mode) is executor:
+        del _executors[mode]
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def _parse_sections_concurrently(workbook: StatementWorkbook, mode: str,
+                                 timings: StageTimings) -> Dict[str, Any]:
+    """
+    Три парсера секций одновременно: потоки работают с общим листом,
+    процессы получают только свои строки (section_frames).
+    Если процесс пула умер (BrokenProcessPool), пул пересоздаётся и разбор
+    повторяется один раз; повторный сбой передаётся вызывающему.
+    """
+    sources = section_frames(workbook) if mode == "processes" else dict.fromkeys(SECTION_PARSERS, workbook)
+    rows = section_rows(workbook)
+    with timings.stage("sections"):
+        for attempt in range(2):
+            executor = _executor(mode)
+            try:
+                futures = {name: executor.submit(_parse_section, name, sources[name]) for name in SECTION_PARSERS}
+                outcomes = {name: future.result() for name, future in futures.items()}
+                break
+            except BrokenProcessPool:
+                _drop_executor(mode, executor)
+                if attempt:
+                    raise
+        results = {}
+        for name, (results[name], seconds) in outcomes.items():
+            ops = results[name]["operations"] if name == "fin" else results[name]
+            timings.add(name, seconds, rows=rows[name], operations=len(ops))
+    return results
+
+def parse_full_statement_batch(file_path: StatementSource, engine: Optional[str] = None,
+                               timings: StageTimings = NULL_TIMINGS,
+                               sections: Optional[str] = None) -> Dict[str, Any]:
+    """
+    То же, что parse_full_statement, но operations — OperationBatch:
+    колоночная форма сохраняется до сериализации (statement_to_dict).
+    В timings (metrics.StageTimings) записываются время, строки листа
+    и число операций каждого этапа.
+    sections — режим разбора секций (см. SECTION_MODES, resolve_section_mode);
+    результат от режима не зависит.
     """
+    with timings.stage("read") as stage:
+        workbook = load_statement(file_path, engine)
+        stage.rows = len(workbook.raw)
+    with timings.stage("index") as stage:
+        # индекс якорей строится здесь, а не внутри первого парсера секций
+        workbook.sections
+        stage.rows = len(workbook.raw)
 
-    # 1) Финансовые операции по счёту
-    fin = parse_financial_operations(file_path)
+    mode = resolve_section_mode(sections, len(workbook.raw))
+    if mode != "serial":
+        parsed = _parse_sections_concurrently(workbook, mode, timings)
+    else:
+        parsed = {}
+        rows = section_rows(workbook)
+        # 1) Финансовые операции по счёту
+        with timings.stage("fin") as stage:
+            stage.rows = rows["fin"]
+            parsed["fin"] = parse_financial_operations_batch(workbook)
+            stage.operations = len(parsed["fin"]["operations"])
+
+        # 2) Сделки по иностранной валюте
+        with timings.stage("forex") as stage:
+            stage.rows = rows["forex"]
+            parsed["forex"] = parse_forex_trades_batch(workbook)
+            stage.operations = len(parsed["forex"])
+
+        # 3) Сделки с акциями и облигациями
+        with timings.stage("stocks") as stage:
+            stage.rows = rows["stocks"]
+            parsed["stocks"] = parse_stock_bond_trades_batch(workbook)
+            stage.operations = len(parsed["stocks"])
+
+    fin = parsed["fin"]
     header_data = {
         "account_id":         fin.get("account_id"),
         "account_date_start": fin.get("account_date_start"),
         "date_start":         fin.get("date_start"),
         "date_end":           fin.get("date_end"),
     }
-    fin_ops = fin.get("operations", [])
-
-    # 2) Сделки по иностранной валюте
-    forex_ops = parse_forex_trades(file_path)
-
-    # 3) Сделки с акциями и облигациями
-    stockbond_ops = parse_stock_bond_trades(file_path)
-
-    # 4) Объединяем все операции
-    all_ops: List[Dict[str, Any]] = fin_ops + forex_ops + stockbond_ops
+    fin_ops = fin["operations"]
+    forex_ops = parsed["forex"]
+    stockbond_ops = parsed["stocks"]
 
-    # 5) Нормализуем currency для каждой операции
-    for op in all_ops:
-        normalize_currency(op)
+    # 4) Каждая секция уже упорядочена по дате — сливаем их (k-way merge по
+    #    целочисленному ключу даты). При равных датах: счёт, валюта, бумаги
+    with timings.stage("merge") as stage:
+        all_ops = OperationBatch.merge_sorted([fin_ops, forex_ops, stockbond_ops])
+        stage.operations = len(all_ops)
 
-    # 6) Сортируем по дате
-    all_ops.sort(key=lambda op: op.get("date", ""))
+    # 5) Нормализуем currency — по одному разу на различное значение
+    with timings.stage("currency") as stage:
+        all_ops.map_column("currency", lambda cur: CURRENCY_DICT.get(cur, cur))
+        stage.operations = len(all_ops)
 
     return {
         **header_data,
         "operations": all_ops
     }
 
+def parse_full_statement_timed(file_path: StatementSource,
+                               engine: Optional[str] = None) -> Tuple[Dict[str, Any], StageTimings]:
+    """
+    parse_full_statement_batch вместе с разбивкой по этапам
+    (для запуска в процессе-воркере: timings возвращаются вместе с результатом).
+    """
+    timings = StageTimings()
+    return parse_full_statement_batch(file_path, engine, timings), timings
+
+#  Встроенная выписка для проверки готовности: по SELF_CHECK_ROWS строк в каждой секции
+SELF_CHECK_ROWS = 2
+
+def self_check() -> int:
+    """
+    Разбирает крошечную синтетическую выписку (synthetic.py), сгенерированную
+    в памяти: прогревает чтение xlsx и все парсеры секций. Возвращает число
+    операций; RuntimeError, если найдено не столько, сколько записано.
+    """
+    import io
+    from synthetic import generate_statement
+
+    buf = io.BytesIO()
+    generate_statement(buf, cash_ops=SELF_CHECK_ROWS, fx_trades=SELF_CHECK_ROWS, trades=SELF_CHECK_ROWS,
+                       instruments=1, currencies=1)
+    found = len(parse_full_statement_batch(buf.getvalue())["operations"])
+    if found != 3 * SELF_CHECK_ROWS:
+        raise RuntimeError(f"Проверочная выписка: найдено {found} операций вместо {3 * SELF_CHECK_ROWS}")
+    return found
+
+def statement_to_dict(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Результат parse_full_statement_batch в виде словарей (формат parse_full_statement).
+    """
+    ops = result["operations"]
+    if isinstance(ops, OperationBatch):
+        return {**result, "operations": ops.to_dicts()}
+    return result
+
+def iter_statement_records(result: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Записи результата для построчной выдачи (NDJSON): сначала метаданные
+    счёта (всё, кроме operations), затем по одной операции.
+    operations — список словарей или OperationBatch.
+    """
+    yield {k: v for k, v in result.items() if k != "operations"}
+    yield from result.get("operations", [])
+
 if __name__ == "__main__":
-    import sys
-    path = sys.argv[1] if len(sys.argv) > 1 else "4.xls"
-    result = parse_full_statement(path)
-    print(json.dumps(result, ensure_ascii=False, indent=2))
+    import argparse
+    from export import EXPORT_FORMATS, export_statement
+    from fast_json import encode_statement, iter_ndjson
+    from reader import ENGINES
+
+    parser = argparse.ArgumentParser(description="Разбор брокерской выписки в JSON")
+    parser.add_argument("path", nargs="?", default="4.xls")
+    parser.add_argument("--engine", choices=ENGINES, default=None,
+                        help="движок чтения Excel (по умолчанию STATEMENT_READER_ENGINE или pandas)")
+    parser.add_argument("--ndjson", action="store_true",
+                        help="метаданные и операции по одной JSON-записи на строку")
+    parser.add_argument("--export", choices=EXPORT_FORMATS, default=None,
+                        help="таблица операций в Parquet, Arrow IPC или CSV вместо JSON")
+    parser.add_argument("-o", "--output", default=None,
+                        help="файл для --export (по умолчанию stdout)")
+    parser.add_argument("--sections", choices=SECTION_MODES, default=None,
+                        help="разбор секций: по очереди, потоками, процессами или auto "
+                             "(по умолчанию PARSER_SECTIONS или serial)")
+    parser.add_argument("--ledger", default=None, metavar="DIR",
+                        help="инкрементальный режим: только новые и изменённые операции (журнал счёта в DIR)")
+    parser.add_argument("--no-watermark", action="store_true",
+                        help="с --ledger: сравнивать и операции до последнего известного дня")
+    parser.add_argument("--timings", action="store_true",
+                        help="время, строки и операции по этапам разбора — в stderr")
+    parser.add_argument("--low-memory", action="store_true",
+                        help="построчное чтение и выдача NDJSON порциями: память не растёт с размером "
+                             "выписки, операции — в порядке листа (см. low_memory.py)")
+    args = parser.parse_args()
+
+    if args.low_memory:
+        if args.export or args.ledger or args.sections or args.timings:
+            parser.error("--low-memory не сочетается с --export, --ledger, --sections и --timings")
+        from fast_json import dumps
+        from low_memory import iter_statement
+        out = sys.stdout.buffer
+        for record in iter_statement(args.path):
+            out.write(dumps(record, allow_nan=True) + b"\n")
+        sys.exit(0)
+
+    timings = StageTimings() if args.timings else NULL_TIMINGS
+    result = parse_full_statement_batch(args.path, engine=args.engine, timings=timings, sections=args.sections)
+    if args.ledger:
+        from ledger import LedgerStore
+        ledger = LedgerStore(args.ledger)
+        with timings.stage("ledger") as stage:
+            # операции записываются в журнал только после того, как выведены
+            result = ledger.ingest(result, use_watermark=not args.no_watermark, commit=False)
+            stage.operations = len(result["operations"])
+    out = sys.stdout.buffer
+    with timings.stage("encode") as stage:
+        stage.operations = len(result["operations"])
+        if args.export:
+            export_statement(result, args.output or out, args.export)
+        elif args.ndjson:
+            out.writelines(iter_ndjson(result))
+        else:
+            out.write(encode_statement(result, indent=True, allow_nan=True) + b"\n")
+        out.flush()
+    if args.ledger and result["ingest"]["cursor"]:
+        ledger.commit(result["account_id"], result["ingest"]["cursor"])
+    for stage in timings:
+        print(f"{stage.name:<9} {stage.seconds * 1000:9.1f} ms"
+              f"  rows={stage.rows if stage.rows is not None else '-'}"
+              f"  operations={stage.operations if stage.operations is not None else '-'}", file=sys.stderr)
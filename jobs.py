@@ -0,0 +1,232 @@
+# jobs.py
+
+import asyncio
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from fileio import read_json, write_atomic
+from metrics import ReportingTimings
+from settings import env_int
+
+# Job states; done and failed are final
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+FINISHED = (DONE, FAILED)
+
+# Priority lanes of the job queue
+SMALL, LARGE = "small", "large"
+
+_JOB_ID_RE = re.compile(r"[0-9a-f]{32}")
+
+
+class JobQueueFull(Exception):
+    """Raised when the job queue holds its maximum number of waiting jobs."""
+
+
+class JobStore:
+    """
+    File-backed state of asynchronous parse jobs, in directory
+    (PARSER_JOBS_DIR, default: <tmp>/trades_parser_jobs). Per job:
+
+    - <id>.json          metadata (status, lane, size, timestamps, error),
+                         written by the API process only
+    - <id>.progress.json per-stage progress, written by the worker
+    - <id>.result.json   the rendered result once the job is done
+    - <id>.input<ext>    the uploaded statement while the job is pending
+
+    Finished jobs expire ttl seconds after they finish (PARSER_JOB_TTL,
+    default 3600); purge() removes them.
+    """
+
+    def __init__(self, directory: Optional[str] = None, ttl: Optional[float] = None):
+        self.directory = directory or os.environ.get("PARSER_JOBS_DIR") \
+            or os.path.join(tempfile.gettempdir(), "trades_parser_jobs")
+        self.ttl = env_int("PARSER_JOB_TTL", 3600) if ttl is None else ttl
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, job_id: str, suffix: str) -> str:
+        if not _JOB_ID_RE.fullmatch(job_id):
+            raise KeyError(job_id)
+        return os.path.join(self.directory, job_id + suffix)
+
+    def create(self, filename: str, lane: str, size: int) -> Dict[str, Any]:
+        job = {"id": uuid.uuid4().hex, "status": QUEUED, "filename": filename, "lane": lane, "size": size,
+               "created_at": time.time(), "started_at": None, "finished_at": None,
+               "operations": None, "error": None}
+        self.save(job)
+        return job
+
+    def save(self, job: Dict[str, Any]) -> None:
+        write_atomic(self.path(job["id"], ".json"), json.dumps(job, ensure_ascii=False).encode("utf-8"))
+
+    def update(self, job_id: str, **fields: Any) -> Dict[str, Any]:
+        job = self.load(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        job.update(fields)
+        self.save(job)
+        return job
+
+    def _expired(self, job: Dict[str, Any]) -> bool:
+        finished = job.get("finished_at")
+        return self.ttl > 0 and finished is not None and time.time() - finished > self.ttl
+
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job metadata, or None for an unknown or expired job."""
+        try:
+            job = read_json(self.path(job_id, ".json"))
+        except KeyError:
+            return None
+        if job is None or self._expired(job):
+            return None
+        return job
+
+    def progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return read_json(self.path(job_id, ".progress.json"))
+
+    def input_path(self, job_id: str, suffix: str) -> str:
+        return self.path(job_id, ".input" + suffix)
+
+    def result_path(self, job_id: str) -> str:
+        return self.path(job_id, ".result.json")
+
+    def write_result(self, job_id: str, body: bytes) -> None:
+        write_atomic(self.result_path(job_id), body)
+
+    def remove(self, job_id: str) -> None:
+        prefix = job_id + "."
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def purge(self) -> int:
+        """Remove the files of expired jobs; returns how many were removed."""
+        removed = 0
+        for name in os.listdir(self.directory):
+            job_id, _, suffix = name.partition(".")
+            if suffix != "json" or not _JOB_ID_RE.fullmatch(job_id):
+                continue
+            job = read_json(os.path.join(self.directory, name))
+            if job is not None and self._expired(job):
+                self.remove(job_id)
+                removed += 1
+        return removed
+
+    def recover(self) -> int:
+        """
+        Fail the jobs a previous process left queued or running: the queue
+        lives in memory, so nobody will run them. Returns how many were failed.
+        """
+        failed = 0
+        for name in os.listdir(self.directory):
+            job_id, _, suffix = name.partition(".")
+            if suffix != "json" or not _JOB_ID_RE.fullmatch(job_id):
+                continue
+            job = read_json(os.path.join(self.directory, name))
+            if job is not None and job["status"] not in FINISHED:
+                for leftover in os.listdir(self.directory):
+                    if leftover.startswith(job_id + ".input"):
+                        os.remove(os.path.join(self.directory, leftover))
+                job.update(status=FAILED, finished_at=time.time(), error="Interrupted by a server restart")
+                self.save(job)
+                failed += 1
+        return failed
+
+
+class JobQueue:
+    """
+    Bounded in-process queue of job ids with two priority lanes.
+
+    - max_size:    waiting jobs allowed before put() raises JobQueueFull
+                   (PARSER_JOB_QUEUE, default 64)
+    - large_every: every large_every-th pick goes to the large lane when it
+                   has work, so small statements go first but large ones are
+                   never starved (default 4)
+    """
+
+    def __init__(self, max_size: Optional[int] = None, large_every: int = 4):
+        self.max_size = max_size or env_int("PARSER_JOB_QUEUE", 64)
+        self.large_every = large_every
+        self.lanes: Dict[str, Deque[str]] = {SMALL: deque(), LARGE: deque()}
+        self._picks = 0
+        self._ready: Optional[asyncio.Condition] = None
+
+    def __len__(self) -> int:
+        return sum(len(lane) for lane in self.lanes.values())
+
+    @property
+    def full(self) -> bool:
+        return len(self) >= self.max_size
+
+    def _condition(self) -> asyncio.Condition:
+        # created on first use, inside the running event loop
+        if self._ready is None:
+            self._ready = asyncio.Condition()
+        return self._ready
+
+    async def put(self, job_id: str, lane: str) -> None:
+        if self.full:
+            raise JobQueueFull(f"{len(self)} jobs queued (limit {self.max_size})")
+        ready = self._condition()
+        async with ready:
+            self.lanes[lane].append(job_id)
+            ready.notify()
+
+    async def get(self) -> str:
+        ready = self._condition()
+        async with ready:
+            await ready.wait_for(lambda: len(self) > 0)
+            self._picks += 1
+            small, large = self.lanes[SMALL], self.lanes[LARGE]
+            if large and (not small or self._picks % self.large_every == 0):
+                return large.popleft()
+            return small.popleft()
+
+    def position(self, job_id: str) -> Optional[int]:
+        """Jobs ahead of job_id in its lane, or None when it is not queued."""
+        for lane in self.lanes.values():
+            if job_id in lane:
+                return lane.index(job_id)
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        return {"queued": len(self), "max_size": self.max_size,
+                **{f"queued_{name}": len(lane) for name, lane in self.lanes.items()}}
+
+
+def _progress_writer(path: str):
+    def report(timings: ReportingTimings) -> None:
+        progress = {
+            "stage": timings.running,
+            "stages": {s.name: {"seconds": round(s.seconds, 6), "rows": s.rows, "operations": s.operations}
+                       for s in timings if s.name != timings.running},
+        }
+        write_atomic(path, json.dumps(progress).encode("utf-8"))
+    return report
+
+
+def run_job(source: str, directory: str, job_id: str) -> int:
+    """
+    Worker side of a job: parse the statement at source, publishing the
+    per-stage progress (sheet rows, rows and operations of each section) as
+    the stages run, and write the rendered result to the job's result file,
+    so only the operation count travels back. Returns the operation count.
+    """
+    from fast_json import encode_statement
+    from full_statement import parse_full_statement_batch
+
+    store = JobStore(directory)
+    timings = ReportingTimings(_progress_writer(store.path(job_id, ".progress.json")))
+    result = parse_full_statement_batch(source, timings=timings)
+    with timings.stage("encode") as stage:
+        stage.operations = len(result["operations"])
+        store.write_result(job_id, encode_statement(result))
+    return len(result["operations"])
@@ -0,0 +1,180 @@
+# layout.py
+#
+# Раскладка колонок таблиц выписки (операции по счёту, валюта, акции,
+# облигации). Выписки приходят из нескольких шаблонов брокера, поэтому
+# разобранная раскладка запоминается по отпечатку строки заголовков:
+# повторный шаблон не проходит поиск колонок заново.
+
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import pandas as pd
+
+#  Раскладок в кэше (шаблонов у брокера единицы, запас — на их версии)
+LAYOUT_CACHE_SIZE = 256
+
+
+class LayoutError(ValueError):
+    """
+    Строка заголовков не похожа ни на один известный шаблон:
+    обязательные колонки не найдены ни по ключевым словам, ни по вариантам
+    названий из HEADER_VARIATIONS_TRADES.
+    """
+
+    def __init__(self, kind: str, missing: Sequence[str], headers: Sequence[str], fingerprint: str):
+        self.kind = kind
+        self.missing = tuple(missing)
+        self.headers = tuple(headers)
+        self.fingerprint = fingerprint
+        named = [h for h in headers if h]
+        super().__init__(f"Неизвестная раскладка таблицы «{kind}» (отпечаток {fingerprint}): "
+                         f"не найдены колонки {', '.join(missing)}; заголовки: {named}")
+
+
+@dataclass(frozen=True)
+class ColumnRule:
+    """
+    Как найти колонку по заголовку (названия в нижнем регистре):
+      keywords     — все должны входить в название; alternatives — другие
+                     такие наборы, пробуются по порядку,
+      occurrence   — какая по счёту из подходящих колонок (0 — первая),
+      variation    — поле HEADER_VARIATIONS_TRADES: запасные названия, если
+                     ключевые слова не нашли колонку,
+      required     — без колонки таблицу не разобрать.
+    """
+    keywords: Tuple[str, ...]
+    alternatives: Tuple[Tuple[str, ...], ...] = ()
+    occurrence: int = 0
+    variation: Optional[str] = None
+    required: bool = True
+
+
+@dataclass(frozen=True, eq=False)
+class LayoutSpec:
+    """
+    Колонки одной таблицы: поле -> правило. variations — варианты названий
+    из HEADER_VARIATIONS_TRADES для этой таблицы (или пусто).
+    Сравнивается по тождеству: служит ключом кэша раскладок.
+    """
+    kind: str
+    rules: Mapping[str, ColumnRule]
+    variations: Mapping[str, List[str]] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class Layout:
+    """
+    Разобранная раскладка: поле -> номер колонки (None — необязательной нет).
+    """
+    kind: str
+    fingerprint: str
+    columns: Dict[str, Optional[int]]
+    missing: Tuple[str, ...] = ()
+
+    def __getitem__(self, name: str) -> Optional[int]:
+        return self.columns[name]
+
+
+def normalize_headers(cells: Iterable[Any]) -> List[str]:
+    """
+    Названия колонок для сравнения: строка в нижнем регистре без пробелов
+    по краям, пустая ячейка — "".
+    """
+    return ["" if c is None or (not isinstance(c, str) and pd.isna(c)) else str(c).strip().lower()
+            for c in cells]
+
+
+def header_fingerprint(headers: Sequence[str]) -> str:
+    return hashlib.blake2b("\x1f".join(headers).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _matches(headers: Sequence[str], keywords: Tuple[str, ...]) -> List[int]:
+    return [i for i, h in enumerate(headers) if all(k in h for k in keywords)]
+
+
+def discover_layout(spec: LayoutSpec, headers: Sequence[str], fingerprint: str) -> Layout:
+    """
+    Поиск колонок по правилам spec: сначала ключевые слова всех полей, затем
+    для ненайденных — варианты названий из HEADER_VARIATIONS_TRADES среди
+    ещё не занятых колонок (так парные поля получают первую и вторую).
+    """
+    columns: Dict[str, Optional[int]] = {}
+    for name, rule in spec.rules.items():
+        columns[name] = None
+        for keywords in (rule.keywords,) + rule.alternatives:
+            found = _matches(headers, keywords)
+            if len(found) > rule.occurrence:
+                columns[name] = found[rule.occurrence]
+                break
+
+    taken = {i for i in columns.values() if i is not None}
+    for name, rule in spec.rules.items():
+        if columns[name] is not None or rule.variation not in spec.variations:
+            continue
+        variants = [v.lower() for v in spec.variations[rule.variation]]
+        for i, h in enumerate(headers):
+            if i not in taken and any(v in h for v in variants):
+                columns[name] = i
+                taken.add(i)
+                break
+
+    missing = tuple(name for name, rule in spec.rules.items() if rule.required and columns[name] is None)
+    return Layout(spec.kind, fingerprint, columns, missing)
+
+
+class LayoutCache:
+    """
+    Раскладки по (таблица, отпечаток заголовков), LRU на max_entries.
+    Потокобезопасен: парсеры секций могут работать в потоках.
+    """
+
+    def __init__(self, max_entries: int = LAYOUT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[LayoutSpec, str], Layout]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, spec: LayoutSpec, cells: Iterable[Any]) -> Layout:
+        """
+        Раскладка таблицы по строке заголовков cells. LayoutError, если
+        обязательных колонок нет (неизвестный шаблон).
+        """
+        headers = normalize_headers(cells)
+        fingerprint = header_fingerprint(headers)
+        key = (spec, fingerprint)
+        with self._lock:
+            layout = self._entries.get(key)
+            if layout is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if layout is None:
+            layout = discover_layout(spec, headers, fingerprint)
+            with self._lock:
+                self._entries[key] = layout
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        if layout.missing:
+            raise LayoutError(spec.kind, layout.missing, headers, fingerprint)
+        return layout
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+#  Общий кэш раскладок процесса
+LAYOUTS = LayoutCache()
+
+
+def resolve_layout(spec: LayoutSpec, cells: Iterable[Any]) -> Layout:
+    return LAYOUTS.resolve(spec, cells)
@@ -0,0 +1,371 @@
+# ledger.py
+
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from OperationDTO import OPERATION_FIELDS, OperationBatch
+from fileio import read_json, write_atomic
+from metrics import NULL_TIMINGS, StageTimings
+from settings import env_float
+from workbook import StatementSource
+
+try:
+    import fcntl
+except ImportError:  # no advisory file locks (Windows): one writer per account is assumed
+    fcntl = None
+
+LEDGER_FORMAT = 2
+
+# Period of operations without a date
+UNDATED = "undated"
+
+# account ids name files and directories: no path separators, no leading dot
+_ACCOUNT_RE = re.compile(r"[\w-][\w.-]*")
+_PERIOD_RE = re.compile(r"\d{4}-\d{2}")
+_CURSOR_RE = re.compile(r"[0-9a-f]{32}")
+
+
+def _digest(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=10).hexdigest()
+
+
+def _content_hash(record: Dict[str, Any]) -> str:
+    return _digest(json.dumps([record[f] for f in OPERATION_FIELDS], ensure_ascii=False, default=str))
+
+
+def _fingerprint(record: Dict[str, Any]) -> str:
+    # cash operations have no broker id: date, type, amount, currency and comment identify them
+    parts = (record["date"], record["operation_type"], record["payment_sum"], record["currency"], record["comment"])
+    return _digest(json.dumps(parts, ensure_ascii=False, default=str))
+
+
+def operation_keys(operations: OperationBatch) -> Tuple[List[str], List[str]]:
+    """
+    Ledger key and content hash of every operation.
+    Trades are keyed by operation_id ("id:<id>"). Cash operations are keyed
+    by their fingerprint plus an occurrence number ("fp:<hash>#<n>"), so two
+    identical payments on the same day stay two operations. Overlapping
+    statements cover whole days and number the occurrences the same way.
+    """
+    keys: List[str] = []
+    hashes: List[str] = []
+    occurrences: Dict[str, int] = {}
+    for record in operations:
+        op_id = record["operation_id"]
+        if op_id:
+            key = f"id:{op_id}"
+        else:
+            fp = _fingerprint(record)
+            n = occurrences.get(fp, 0)
+            occurrences[fp] = n + 1
+            key = f"fp:{fp}#{n}"
+        keys.append(key)
+        hashes.append(_content_hash(record))
+    return keys, hashes
+
+
+def _on_or_after(operations: OperationBatch, day: str) -> np.ndarray:
+    """
+    Mask of operations dated on or after day ('YYYY-MM-DD'); undated ones are kept.
+    Works on the date column without building rows.
+    """
+    dates = operations.columns["date"]
+    if not isinstance(dates, np.ndarray):
+        keep = dates is None or str(dates)[:10] >= day
+        return np.full(len(operations), keep, dtype=bool)
+    if dates.dtype.kind == "M":
+        return np.isnat(dates) | (dates >= np.datetime64(day))
+    return np.array([d is None or str(d)[:10] >= day for d in dates.tolist()], dtype=bool)
+
+
+def _last_day(operations: OperationBatch) -> Optional[str]:
+    dates = operations.columns["date"]
+    if not isinstance(dates, np.ndarray):
+        return str(dates)[:10] if dates else None
+    if dates.dtype.kind == "M":
+        valid = dates[~np.isnat(dates)]
+        return str(valid.max())[:10] if len(valid) else None
+    days = [str(d)[:10] for d in dates.tolist() if d]
+    return max(days) if days else None
+
+
+def operation_periods(operations: OperationBatch) -> List[str]:
+    """
+    Ledger period of every operation: month of its date ('YYYY-MM'),
+    UNDATED for operations without a date.
+    """
+    dates = operations.columns["date"]
+    if not isinstance(dates, np.ndarray):
+        return [_period(dates)] * len(operations)
+    if dates.dtype.kind == "M":
+        return [UNDATED if np.isnat(d) else str(d)[:7] for d in dates]
+    return [_period(d) for d in dates.tolist()]
+
+
+def _period(date: Any) -> str:
+    month = str(date)[:7] if date else ""
+    return month if _PERIOD_RE.fullmatch(month) else UNDATED
+
+
+def _write_json(path: str, data: Any) -> None:
+    write_atomic(path, json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+@dataclass
+class AccountLedger:
+    """
+    Operations already delivered for one account, split by the month of the
+    operation date: period -> key -> content hash. Only the periods an
+    ingest touches are loaded. watermark is the last operation day seen.
+    """
+    account_id: str
+    watermark: Optional[str] = None
+    periods: Dict[str, Dict[str, str]] = field(default_factory=dict)
+
+
+class LedgerStore:
+    """
+    Per-account ledgers for incremental ingestion in directory
+    (PARSER_LEDGER_DIR), one subdirectory per account:
+
+    - ledger.json        format and watermark
+    - <YYYY-MM>.json     keys and content hashes of that month's operations
+                         (undated.json for operations without a date)
+    - pending/<cursor>   changes of an ingest that are not committed yet
+
+    An ingest reads and rewrites only the months it touches, so its cost
+    does not grow with the account's history. Files are replaced
+    atomically, and an advisory lock serializes ingests of the same account
+    across threads and worker processes.
+
+    Uncommitted changes expire after pending_ttl seconds
+    (PARSER_LEDGER_PENDING_TTL, default 86400).
+    """
+
+    def __init__(self, directory: Optional[str] = None, pending_ttl: Optional[float] = None):
+        self.directory = directory or os.environ.get("PARSER_LEDGER_DIR")
+        if not self.directory:
+            raise ValueError("Ledger directory is not set (PARSER_LEDGER_DIR)")
+        self.pending_ttl = env_float("PARSER_LEDGER_PENDING_TTL", 86400.0) if pending_ttl is None else pending_ttl
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, account_id: str, suffix: str) -> str:
+        if not _ACCOUNT_RE.fullmatch(account_id):
+            raise ValueError(f"Invalid account id for the ledger: {account_id!r}")
+        return os.path.join(self.directory, f"{account_id}{suffix}")
+
+    def _account_path(self, account_id: str, *names: str) -> str:
+        return os.path.join(self._path(account_id, ""), *names)
+
+    def _pending_path(self, account_id: str, cursor: str) -> str:
+        if not _CURSOR_RE.fullmatch(cursor):
+            raise KeyError(cursor)
+        return self._account_path(account_id, "pending", cursor + ".json")
+
+    @contextmanager
+    def _locked(self, account_id: str) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+        with open(self._path(account_id, ".lock"), "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def load(self, account_id: str) -> AccountLedger:
+        """The account's ledger with its watermark; periods are loaded by period()."""
+        data = read_json(self._account_path(account_id, "ledger.json"))
+        if data is None:
+            return AccountLedger(account_id)
+        if data.get("format") != LEDGER_FORMAT:
+            raise ValueError(f"Unsupported ledger format for account {account_id}: {data.get('format')}")
+        return AccountLedger(account_id, data.get("watermark"))
+
+    def period(self, ledger: AccountLedger, period: str) -> Dict[str, str]:
+        if period not in ledger.periods:
+            path = self._account_path(ledger.account_id, period + ".json")
+            ledger.periods[period] = read_json(path) or {}
+        return ledger.periods[period]
+
+    def save(self, ledger: AccountLedger, periods: Optional[List[str]] = None) -> None:
+        """Write the given periods (default: every loaded one) and the watermark."""
+        os.makedirs(self._account_path(ledger.account_id), exist_ok=True)
+        for period in ledger.periods if periods is None else periods:
+            _write_json(self._account_path(ledger.account_id, period + ".json"), ledger.periods[period])
+        _write_json(self._account_path(ledger.account_id, "ledger.json"),
+                    {"format": LEDGER_FORMAT, "account_id": ledger.account_id, "watermark": ledger.watermark})
+
+    def _apply(self, account_id: str, changes: Dict[str, Dict[str, Tuple[Optional[str], str]]],
+               watermark: Optional[str]) -> Tuple[AccountLedger, int]:
+        """
+        Record changes: period -> key -> (base, content), where base is the
+        hash the key had when the change was staged. An entry whose key has
+        moved on since (another cursor committed a different content first)
+        is stale and left alone, so acks arriving out of order never roll a
+        newer content back. Returns the ledger and the number of stale entries.
+        Caller holds the account lock.
+        """
+        ledger = self.load(account_id)
+        stale = 0
+        for period, entries in changes.items():
+            recorded = self.period(ledger, period)
+            for key, (base, content) in entries.items():
+                current = recorded.get(key)
+                if current == base:
+                    recorded[key] = content
+                elif current != content:
+                    stale += 1
+        if watermark and (ledger.watermark is None or watermark > ledger.watermark):
+            ledger.watermark = watermark
+        self.save(ledger, list(changes))
+        return ledger, stale
+
+    def _purge_pending(self, account_id: str) -> None:
+        # caller holds the account lock
+        directory = self._account_path(account_id, "pending")
+        if self.pending_ttl <= 0 or not os.path.isdir(directory):
+            return
+        expired = time.time() - self.pending_ttl
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            try:
+                if os.path.getmtime(path) < expired:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def ingest(self, result: Dict[str, Any], use_watermark: bool = True, commit: bool = True) -> Dict[str, Any]:
+        """
+        Keeps only the new or changed operations of a parse_full_statement_batch
+        result and records them in the account's ledger.
+
+        With use_watermark, operations dated before the last day already seen
+        are skipped on the date column alone, without building their rows or
+        keys. They are counted as "skipped", not "unchanged": an older
+        statement or a backfill skips everything before the watermark, and
+        corrections to older operations are not detected. Pass
+        use_watermark=False for a full comparison.
+
+        With commit=False the ledger is not changed yet. The changes are staged
+        under a cursor, returned in the summary, and recorded only by
+        commit(account_id, cursor) once the caller has delivered the
+        operations. Until then, a repeated ingest returns them again.
+
+        Returns the result with the filtered OperationBatch and an "ingest"
+        summary: new, changed, unchanged, skipped, skipped_before (the
+        watermark used for skipping, or None), watermark and cursor (None
+        when committed right away).
+        """
+        account_id = result.get("account_id")
+        if not account_id:
+            raise ValueError("Statement has no account_id: cannot ingest incrementally")
+        operations = result["operations"]
+
+        with self._locked(account_id):
+            ledger = self.load(account_id)
+            skipped_before = ledger.watermark if use_watermark else None
+            candidates = np.arange(len(operations))
+            if skipped_before:
+                candidates = np.flatnonzero(_on_or_after(operations, skipped_before))
+            window = operations.take(candidates)
+
+            keys, hashes = operation_keys(window)
+            changes: Dict[str, Dict[str, Tuple[Optional[str], str]]] = {}
+            fresh: List[int] = []
+            new = changed = 0
+            for pos, (period, key, content) in enumerate(zip(operation_periods(window), keys, hashes)):
+                known = self.period(ledger, period).get(key)
+                if known == content:
+                    continue
+                if known is None:
+                    new += 1
+                else:
+                    changed += 1
+                changes.setdefault(period, {})[key] = (known, content)
+                fresh.append(pos)
+
+            last_day = _last_day(window)
+            watermark = ledger.watermark
+            if last_day and (watermark is None or last_day > watermark):
+                watermark = last_day
+            cursor = None
+            if changes or watermark != ledger.watermark:
+                if commit:
+                    self._apply(account_id, changes, watermark)
+                else:
+                    self._purge_pending(account_id)
+                    cursor = uuid.uuid4().hex
+                    os.makedirs(self._account_path(account_id, "pending"), exist_ok=True)
+                    _write_json(self._pending_path(account_id, cursor), {"watermark": watermark, "changes": changes})
+
+        summary = {
+            "new": new,
+            "changed": changed,
+            "unchanged": len(window) - new - changed,
+            "skipped": len(operations) - len(window),
+            "skipped_before": skipped_before,
+            "watermark": watermark,
+            "cursor": cursor,
+        }
+        return {**result, "operations": window.take(np.array(fresh, dtype=np.intp)), "ingest": summary}
+
+    def commit(self, account_id: str, cursor: str) -> Dict[str, Any]:
+        """
+        Record the changes staged by ingest(commit=False) under cursor.
+        Raises KeyError for an unknown, expired or already committed cursor.
+        Returns the number of committed operations, the number of stale ones
+        (changed by a cursor committed in between; see _apply) and the new
+        watermark.
+        """
+        with self._locked(account_id):
+            path = self._pending_path(account_id, cursor)
+            staged = read_json(path)
+            if staged is None:
+                raise KeyError(cursor)
+            ledger, stale = self._apply(account_id, staged["changes"], staged["watermark"])
+            os.remove(path)
+        total = sum(len(entries) for entries in staged["changes"].values())
+        return {"account_id": account_id, "committed": total - stale, "stale": stale, "watermark": ledger.watermark}
+
+
+def ingest_statement(file_path: StatementSource, directory: Optional[str] = None, use_watermark: bool = True,
+                     commit: bool = True, timings: StageTimings = NULL_TIMINGS) -> Dict[str, Any]:
+    """
+    Parse a statement and return only what the account's ledger has not seen
+    (see LedgerStore.ingest for use_watermark and commit).
+    """
+    from full_statement import parse_full_statement_batch
+
+    store = LedgerStore(directory)
+    result = parse_full_statement_batch(file_path, timings=timings)
+    with timings.stage("ledger") as stage:
+        result = store.ingest(result, use_watermark, commit)
+        stage.operations = len(result["operations"])
+    return result
+
+
+def ingest_statement_timed(file_path: StatementSource, directory: Optional[str] = None,
+                           use_watermark: bool = True, commit: bool = True) -> Tuple[Dict[str, Any], StageTimings]:
+    """
+    ingest_statement with the per-stage breakdown (for the worker pool).
+    """
+    timings = StageTimings()
+    return ingest_statement(file_path, directory, use_watermark, commit, timings), timings
+
+
+def commit_ingest(directory: Optional[str], account_id: str, cursor: str) -> Dict[str, Any]:
+    """
+    LedgerStore.commit by name (for the worker pool).
+    """
+    return LedgerStore(directory).commit(account_id, cursor)
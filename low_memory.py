@@ -0,0 +1,258 @@
+# low_memory.py
+#
+# Разбор выписки с ограниченной памятью: лист читается построчно
+# (reader.iter_rows), якоря секций отмечаются тем же построчным автоматом,
+# что и в sections.build_section_index, а строки таблиц копятся порциями
+# не больше chunk_rows и разбираются теми же колоночными парсерами секций.
+# В памяти — только текущие порции и строки контекста (заголовок таблицы,
+# маркер валюты, строка инструмента), операции выдаются генератором.
+
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from OperationDTO import OperationBatch
+from classifier import TICKER_ROW_RE, TOM_TICKER_RE, TOTAL_ROW_RE
+from constants import (
+    CASH_HEADER_KEYWORDS,
+    CURRENCY_DICT,
+    FOREX_BLOCK_ANCHOR,
+    FOREX_HEADER_KEYWORDS,
+    TOTAL_KEYWORD,
+    TRADE_HEADER_KEYWORDS,
+    TRADE_SECTION_KEYWORDS,
+    TRADES_BLOCK_ANCHOR,
+    VALID_OPERATIONS,
+)
+from fin_operations import CASH_LAYOUT, parse_financial_operations_batch
+from forex_trades import parse_forex_trades_batch
+from layout import resolve_layout
+from reader import iter_rows
+from sections import has_all, is_cell_header
+from settings import env_int
+from stocks_bounds import SECTION_SPECS, parse_trade_section_batch
+from utils import parse_header_data
+from workbook import NA_STRINGS, StatementWorkbook, cell_to_str, frame_from_rows
+
+#  Строк таблицы в одной порции разбора (PARSER_LOW_MEMORY_ROWS)
+CHUNK_ROWS = env_int("PARSER_LOW_MEMORY_ROWS", 5000)
+
+Row = List[Any]
+
+
+def _cells(row: Row) -> Row:
+    # те же пропуски, что и в frame_from_rows: NA-строки -> пустая ячейка
+    return [None if v is None or (v.__class__ is str and v in NA_STRINGS) else v for v in row]
+
+
+def _is_forex_ticker(cells: Row, total: bool) -> bool:
+    # строка пары «…_TOM» в блоке валюты (см. parse_forex_trades_batch)
+    return not total and any(c.__class__ is str and TOM_TICKER_RE.fullmatch(c.strip()) for c in cells)
+
+
+def _is_trade_ticker(cells: Row) -> bool:
+    # строка инструмента в таблице сделок (см. classifier.classify_rows;
+    # пустые строки в таблицу не попадают)
+    texts = [c.lower() for c in cells if c.__class__ is str]
+    return any(TICKER_ROW_RE.search(t) for t in texts) and not any(TOTAL_ROW_RE.match(t) for t in texts)
+
+
+class _Table:
+    """
+    Таблица, строки которой разбираются порциями. Перед каждой порцией
+    ставятся prefix (заголовок и т. п.) и carry — последняя строка-маркер
+    (валюта или инструмент), встреченная до начала порции.
+    """
+
+    def __init__(self, prefix: List[Row], parse: Callable[[List[Row]], OperationBatch],
+                 is_marker: Callable[[Row], bool]):
+        self.prefix = prefix
+        self.parse = parse
+        self.is_marker = is_marker
+        self.rows: List[Row] = []
+        self.carry: Optional[Row] = None
+        self.latest: Optional[Row] = None
+
+    def add(self, cells: Row, marker: Optional[bool] = None) -> None:
+        self.rows.append(cells)
+        if self.is_marker(cells) if marker is None else marker:
+            self.latest = cells
+
+    def flush(self) -> OperationBatch:
+        if not self.rows:
+            return OperationBatch.empty()
+        context = self.prefix + ([self.carry] if self.carry is not None else [])
+        batch = self.parse(context + self.rows)
+        self.rows = []
+        if self.latest is not None:
+            self.carry = self.latest
+        return batch
+
+
+def _parse_cash(rows: List[Row]) -> OperationBatch:
+    return parse_financial_operations_batch(StatementWorkbook(frame_from_rows(rows)))["operations"]
+
+
+def _parse_forex(rows: List[Row]) -> OperationBatch:
+    return parse_forex_trades_batch(StatementWorkbook(frame_from_rows(rows)))
+
+
+def _trade_parser(kind: str) -> Callable[[List[Row]], OperationBatch]:
+    def parse(rows: List[Row]) -> OperationBatch:
+        return parse_trade_section_batch(frame_from_rows(rows), SECTION_SPECS[kind], 0)
+    return parse
+
+
+class LowMemoryParser:
+    """
+    Построчный разбор выписки. feed() принимает строку листа и выдаёт
+    операции, готовые к этому моменту; finish() — оставшиеся.
+    Результат тот же, что у parse_full_statement_batch, кроме порядка:
+    операции идут по мере чтения листа (секции и порции по очереди),
+    внутри порции — по дате.
+    """
+
+    def __init__(self, chunk_rows: int = CHUNK_ROWS):
+        self.chunk_rows = chunk_rows
+        self.header: Dict[str, Any] = {"account_id": None, "account_date_start": None,
+                                       "date_start": None, "date_end": None}
+        self.header_ready = False
+        self.currency_row: Optional[Row] = None
+
+        self.cash: Optional[_Table] = None
+        self.cash_op_col: Optional[int] = None
+
+        self.forex_anchor: Optional[Row] = None
+        self.forex_seen_header = False
+        self.forex: Optional[_Table] = None
+
+        self.trades_started = False
+        self.trade_kind: Optional[str] = None
+        self.trade_header_seen = False
+        self.trades: Optional[_Table] = None
+
+    def _emit(self, table: Optional[_Table], force: bool = False) -> Iterator[OperationBatch]:
+        if table is not None and table.rows and (force or len(table.rows) >= self.chunk_rows):
+            batch = table.flush()
+            if len(batch):
+                yield batch
+
+    def feed(self, row: Row) -> Iterator[OperationBatch]:
+        cells = _cells(row)
+        row_str = " ".join(str(c) for c in cells if c is not None)
+        text = row_str.lower()
+        stripped = row_str.strip()
+        blank = not stripped
+        total = TOTAL_KEYWORD in text
+        currency = stripped in CURRENCY_DICT
+        if currency:
+            self.currency_row = cells
+
+        # 1) операции по счёту: всё после заголовка таблицы, как у парсера секции
+        if self.cash is None:
+            if has_all(text, CASH_HEADER_KEYWORDS):
+                self.cash = _Table([cells], _parse_cash, lambda c: False)
+                self.cash.carry = self.currency_row
+                self.cash_op_col = resolve_layout(CASH_LAYOUT, cells)["op"]
+                self.header_ready = True
+            else:
+                parse_header_data(" ".join(cell_to_str(c).strip() for c in cells if c is not None), self.header)
+        elif currency or self._cash_candidate(cells):
+            # прочие строки заведомо не операции по счёту — в порцию не попадают
+            self.cash.add(cells, marker=currency)
+            yield from self._emit(self.cash)
+
+        # 2) сделки с валютой: от заголовка до первой пустой строки
+        if self.forex_anchor is None:
+            if FOREX_BLOCK_ANCHOR in text:
+                self.forex_anchor = cells
+        elif not self.forex_seen_header:
+            if has_all(text, FOREX_HEADER_KEYWORDS):
+                self.forex_seen_header = True
+                self.forex = _Table([self.forex_anchor, cells], _parse_forex, lambda c: False)
+        elif self.forex is not None:
+            if blank:
+                yield from self._emit(self.forex, force=True)
+                self.forex = None
+            else:
+                self.forex.add(cells, marker=_is_forex_ticker(cells, total))
+                yield from self._emit(self.forex)
+
+        # 3) сделки с бумагами: подразделы «Акция»/«Облигация», таблица —
+        #    от заголовка до пустой строки или следующего подраздела
+        if not self.trades_started:
+            if TRADES_BLOCK_ANCHOR in text:
+                self.trades_started = True
+            return
+        for kind, keywords in TRADE_SECTION_KEYWORDS.items():
+            if any(k in text for k in keywords):
+                yield from self._emit(self.trades, force=True)
+                self.trade_kind, self.trade_header_seen, self.trades = kind, False, None
+                return
+        if self.trade_kind is None:
+            return
+        if not self.trade_header_seen:
+            if is_cell_header([c for c in cells if c is not None], text, TRADE_HEADER_KEYWORDS[self.trade_kind]):
+                self.trade_header_seen = True
+                self.trades = _Table([cells], _trade_parser(self.trade_kind), _is_trade_ticker)
+        elif self.trades is not None:
+            if blank:
+                yield from self._emit(self.trades, force=True)
+                self.trades = None
+            else:
+                self.trades.add(cells)
+                yield from self._emit(self.trades)
+
+    def _cash_candidate(self, cells: Row) -> bool:
+        col = self.cash_op_col
+        if col is None or col >= len(cells) or cells[col] is None:
+            return False
+        return cell_to_str(cells[col]).strip() in VALID_OPERATIONS
+
+    def finish(self) -> Iterator[OperationBatch]:
+        for table in (self.cash, self.forex, self.trades):
+            yield from self._emit(table, force=True)
+
+
+def iter_statement(source: Any, chunk_rows: int = CHUNK_ROWS) -> Iterator[Dict[str, Any]]:
+    """
+    Выписка записями, как iter_statement_records: сначала метаданные счёта,
+    затем по одной операции (currency — через CURRENCY_DICT).
+
+    Память не растёт с числом строк листа: порядка 3 * chunk_rows строк
+    таблиц и их DataFrame-порций плюс состояние ридера (для .xlsx — таблица
+    общих строк книги, для .xls — лист xlrd, не больше 65536 строк).
+    Операции не сортируются по дате по всей выписке — это потребовало бы
+    держать их все; порядок — по мере чтения листа.
+
+    Метаданные берутся из строк над таблицей операций по счёту; если
+    операции других секций готовы раньше, чем она встретилась, метаданные
+    выдаются пустыми (None).
+    """
+    parser = LowMemoryParser(chunk_rows)
+    header_sent = False
+
+    def records(batches: Iterator[OperationBatch]) -> Iterator[Dict[str, Any]]:
+        nonlocal header_sent
+        for batch in batches:
+            if not header_sent:
+                header_sent = True
+                yield dict(parser.header)
+            batch.map_column("currency", lambda cur: CURRENCY_DICT.get(cur, cur))
+            yield from batch
+
+    for row in iter_rows(source):
+        yield from records(parser.feed(row))
+        if parser.header_ready and not header_sent:
+            header_sent = True
+            yield dict(parser.header)
+    yield from records(parser.finish())
+    if not header_sent:
+        yield dict(parser.header)
+
+
+def iter_operations(source: Any, chunk_rows: int = CHUNK_ROWS) -> Iterator[Dict[str, Any]]:
+    """
+    Только операции из iter_statement (без записи метаданных).
+    """
+    records = iter_statement(source, chunk_rows)
+    next(records)
+    return records
@@ -1,50 +1,674 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
-import uvicorn
-import shutil
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.formparsers import MultiPartParser
+import hashlib
+import importlib
+import json
 import os
 import tempfile
+import time
+import zipfile
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+# Only light modules are imported here: the parsing stack (pandas, xlrd,
+# parsers) is loaded by the workers, so the app binds and answers /healthz
+# right away. See README for the -X importtime baseline.
+import fast_json
+from batch import batch_record, chunked, is_statement
+from jobs import DONE, FAILED, LARGE, QUEUED, RUNNING, SMALL, JobQueue, JobQueueFull, JobStore
+from metrics import StageTimings, new_timings, observe_timings, profile_call, render_metrics
+from parse_pool import JobTimeout, ParsePool, PoolSaturated, call_target
+from result_cache import ResultCache, content_key, hash_bytes
+from settings import env_bool, env_float, env_int
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered through fast_json (orjson/msgspec when installed)."""
+
+    def render(self, content: Any) -> bytes:
+        return fast_json.dumps(content)
+
+
+parse_pool = ParsePool()
+result_cache = ResultCache()
+
+# Uploads up to this size are parsed straight from memory; larger ones are
+# spilled to a temp file so they are not pickled into the worker process.
+UPLOAD_SPOOL_LIMIT = int(os.environ.get("PARSER_SPOOL_LIMIT", 16 * 1024 * 1024))
+
+# Per-stage breakdown in a Server-Timing response header
+SERVER_TIMING = env_bool("PARSER_SERVER_TIMING", False)
+# ?profile=1 is honoured only when a directory for the reports is configured
+PROFILE_DIR = os.environ.get("PARSER_PROFILE_DIR")
+PROFILER = os.environ.get("PARSER_PROFILER", "cprofile")
+# ?incremental=1 is honoured only when the per-account ledgers have a home (see ledger.py)
+LEDGER_DIR = os.environ.get("PARSER_LEDGER_DIR")
+
+
+# Worker jobs are addressed by name (see parse_pool.call_target)
+PARSE_TARGET = "full_statement:parse_full_statement_batch"
+PARSE_TIMED_TARGET = "full_statement:parse_full_statement_timed"
+INGEST_TARGET = "ledger:ingest_statement"
+INGEST_TIMED_TARGET = "ledger:ingest_statement_timed"
+INGEST_COMMIT_TARGET = "ledger:commit_ingest"
+BATCH_TARGET = "batch:parse_chunk"
+
+# /parse-statements: files per worker job and files per request (zip members included)
+BATCH_CHUNK = env_int("PARSER_BATCH_CHUNK", 4)
+BATCH_MAX_FILES = env_int("PARSER_BATCH_MAX_FILES", 1000)
+# /parse-statements: bytes of one request's statements kept in memory; the rest go to temp files
+BATCH_MEMORY_LIMIT = env_int("PARSER_BATCH_MEMORY", 64 * 1024 * 1024)
+
+# Asynchronous jobs (see jobs.py): statements up to JOB_SMALL_BYTES take the
+# priority lane; a job may run for JOB_TIMEOUT seconds
+JOB_TARGET = "jobs:run_job"
+JOB_SMALL_BYTES = env_int("PARSER_JOB_SMALL_BYTES", 512 * 1024)
+JOB_TIMEOUT = env_float("PARSER_ASYNC_JOB_TIMEOUT", 900.0)
+job_store = JobStore()
+job_queue = JobQueue()
+
+logger = logging.getLogger(__name__)
+_warm_up_task: Optional[asyncio.Task] = None
+_job_tasks: List[asyncio.Task] = []
+
+
+async def _warm_up() -> None:
+    # Spawn the workers (each imports the parsers and parses a tiny embedded
+    # statement), then load what this process needs to decode their results
+    await parse_pool.warm_up()
+    await run_in_threadpool(importlib.import_module, "OperationDTO")
+    fast_json.get_backend()
+
+
+def _log_warm_up(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Parser warm-up failed", exc_info=task.exception())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so the server starts accepting connections
+    # immediately; /readyz reports when the parsers are usable
+    global _warm_up_task
+    # Let the multipart parser keep uploads below UPLOAD_SPOOL_LIMIT in RAM
+    # (Starlette spools anything above 1 MiB to disk). spool_max_size is a
+    # class attribute, so this affects every Starlette app in the process:
+    # it is set only while this app runs, not when main is merely imported,
+    # and restored on shutdown.
+    spool_max_size = MultiPartParser.spool_max_size
+    MultiPartParser.spool_max_size = UPLOAD_SPOOL_LIMIT
+    _warm_up_task = asyncio.create_task(_warm_up())
+    _warm_up_task.add_done_callback(_log_warm_up)
+    # Jobs left queued or running by a previous process cannot resume
+    recovered = await run_in_threadpool(job_store.recover)
+    if recovered:
+        logger.warning("Marked %d interrupted jobs as failed", recovered)
+    _job_tasks.extend(asyncio.create_task(_dispatch_jobs()) for _ in range(parse_pool.workers))
+    _job_tasks.append(asyncio.create_task(_purge_jobs()))
+    yield
+    _warm_up_task.cancel()
+    for task in _job_tasks:
+        task.cancel()
+    _job_tasks.clear()
+    parse_pool.shutdown()
+    MultiPartParser.spool_max_size = spool_max_size
 
-from full_statement import parse_full_statement
 
 app = FastAPI(
     title="Financial Statement Parser API",
     description="API for parsing financial statements including cash operations, forex trades, and stock/bond trades.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
+
+def _save_upload(src, suffix: str, directory: Optional[str] = None, prefix: Optional[str] = None) -> Tuple[str, str]:
+    """Copy the upload to a named temp file, hashing it on the way."""
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=directory, prefix=prefix) as tmp:
+        try:
+            for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                digest.update(chunk)
+                tmp.write(chunk)
+        except BaseException:
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+        return tmp.name, digest.hexdigest()
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _ndjson_response(result: Dict[str, Any], cache_status: str) -> StreamingResponse:
+    # One encoded record per chunk: the full document is never built in memory
+    return StreamingResponse(fast_json.iter_ndjson(result), media_type=NDJSON_MEDIA_TYPE,
+                             headers={"X-Cache": cache_status})
+
+
+def _finish(response: Response, timings: StageTimings, started: float) -> Response:
+    # Record the request in the /metrics histograms and, optionally, in Server-Timing
+    if timings.enabled:
+        timings.add("total", time.perf_counter() - started)
+        observe_timings(timings)
+        if SERVER_TIMING:
+            response.headers["Server-Timing"] = timings.server_timing()
+    return response
+
+
 @app.post("/parse-statement")
-async def parse_statement(file: UploadFile = File(...)):
+async def parse_statement(
+    request: Request,
+    file: UploadFile = File(...),
+    stream: bool = Query(False, description="Respond with NDJSON: metadata line, then one operation per line"),
+    profile: bool = Query(False, description="Profile the parse and save the report to PARSER_PROFILE_DIR"),
+    incremental: bool = Query(False, description="Return only operations the account's ledger has not seen yet"),
+    watermark: bool = Query(True, description="With incremental=1: skip operations dated before the ledger's "
+                                              "watermark; watermark=0 compares all of them (older statements, backfills)"),
+):
     """
     Upload an Excel file (.xls or .xlsx) of a brokerage statement.
     Returns a JSON with account metadata and a unified list of operations.
+    With `?stream=1` or `Accept: application/x-ndjson` the response is NDJSON:
+    the first line holds the metadata, every following line one operation.
+    Parsing runs in a worker process; responds 503 when the pool is saturated
+    and 504 when the job exceeds its timeout.
+    With `?incremental=1` only new or changed operations are returned, plus an
+    "ingest" summary. They are recorded in the account's ledger only when the
+    client confirms delivery with `POST /ledger/{account_id}/ack?cursor=...`
+    (the cursor is in the summary); until then a retry returns them again.
+    Operations dated before the ledger's watermark are skipped and counted as
+    "skipped" unless `?watermark=0`.
     """
+    started = time.perf_counter()
+    timings = new_timings()
+    stream = stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+    if profile and not PROFILE_DIR:
+        raise HTTPException(status_code=400, detail="Profiling is disabled: PARSER_PROFILE_DIR is not set")
+    if incremental and not LEDGER_DIR:
+        raise HTTPException(status_code=400, detail="Incremental mode is disabled: PARSER_LEDGER_DIR is not set")
+
     # Validate file extension
     filename = file.filename
     if not filename.lower().endswith(('.xls', '.xlsx')):
         raise HTTPException(status_code=400, detail="Unsupported file type. Please upload .xls or .xlsx")
 
-    # Save uploaded file to a temporary location
+    # Small uploads are handed to the worker as bytes, large ones via a temp file
+    tmp_path = None
+    try:
+        try:
+            with timings.stage("upload"):
+                if file.size is not None and file.size <= UPLOAD_SPOOL_LIMIT:
+                    source = await file.read()
+                    digest = await run_in_threadpool(hash_bytes, source)
+                else:
+                    tmp_path, digest = await run_in_threadpool(_save_upload, file.file, os.path.splitext(filename)[1])
+                    source = tmp_path
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to read uploaded file: {e}")
+        finally:
+            await file.close()
+
+        # The same file parsed by the same parser version is served from cache
+        # (a profiled request always runs the parser; an incremental one
+        # depends on the ledger state, so it bypasses the cache entirely)
+        key = content_key(digest)
+        cached = None
+        if not profile and not incremental:
+            with timings.stage("cache"):
+                cached = await run_in_threadpool(result_cache.get, key)
+        if cached is not None:
+            if stream:
+                return _finish(_ndjson_response(json.loads(cached), "hit"), timings, started)
+            response = Response(content=cached, media_type="application/json", headers={"X-Cache": "hit"})
+            return _finish(response, timings, started)
+
+        # Parse the statement in the process pool; with metrics on, the worker
+        # also sends back its per-stage timings
+        if incremental:
+            target = INGEST_TIMED_TARGET if timings.enabled else INGEST_TARGET
+            # staged only: the ledger is updated when the client acks the cursor
+            args = (source, LEDGER_DIR, watermark, False)
+        else:
+            target = PARSE_TIMED_TARGET if timings.enabled else PARSE_TARGET
+            args = (source,)
+        profile_path = None
+        try:
+            with timings.stage("parse"):
+                if profile:
+                    out, profile_path = await parse_pool.submit(profile_call, PROFILE_DIR, digest[:16], PROFILER,
+                                                                call_target, target, *args)
+                else:
+                    out = await parse_pool.submit(call_target, target, *args)
+        except PoolSaturated:
+            raise HTTPException(status_code=503, detail="Parser is busy, retry later", headers={"Retry-After": "1"})
+        except JobTimeout as e:
+            raise HTTPException(status_code=504, detail=f"Parsing timed out: {e}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error parsing statement: {e}")
+    finally:
+        # Clean up temp file, whatever happened above
+        if tmp_path is not None:
+            os.remove(tmp_path)
+
+    if timings.enabled:
+        result, worker_timings = out
+        timings.merge(worker_timings)
+    else:
+        result = out
+    headers = {"X-Cache": "bypass" if incremental else "miss"}
+    if profile_path is not None:
+        headers["X-Profile"] = os.path.basename(profile_path)
+
+    if stream:
+        # Streamed results are not cached: that would need the full document
+        response = _ndjson_response(result, "miss")
+        response.headers.update(headers)
+        return _finish(response, timings, started)
+
+    # The worker returns operations in columnar form; rows are built only here
+    with timings.stage("encode") as stage:
+        body = fast_json.encode_statement(result)
+        stage.operations = len(result["operations"])
+    if not incremental:
+        await run_in_threadpool(result_cache.put, key, body)
+    return _finish(Response(content=body, media_type="application/json", headers=headers), timings, started)
+
+
+@app.post("/ledger/{account_id}/ack")
+async def ack_ingest(account_id: str, cursor: str = Query(..., description="The cursor of an incremental parse")):
+    """
+    Confirm that the operations of an incremental parse (`?incremental=1`)
+    were delivered: records them in the account's ledger, so the next
+    incremental parse no longer returns them. Responds 404 for an unknown,
+    expired or already acknowledged cursor.
+    """
+    if not LEDGER_DIR:
+        raise HTTPException(status_code=400, detail="Incremental mode is disabled: PARSER_LEDGER_DIR is not set")
+    try:
+        return await parse_pool.submit(call_target, INGEST_COMMIT_TARGET, LEDGER_DIR, account_id, cursor)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown, expired or already acknowledged cursor")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PoolSaturated:
+        raise HTTPException(status_code=503, detail="Parser is busy, retry later", headers={"Retry-After": "1"})
+    except JobTimeout as e:
+        raise HTTPException(status_code=504, detail=f"Acknowledgement timed out: {e}")
+
+
+class BatchFile:
+    """One statement of a /parse-statements request."""
+
+    __slots__ = ("name", "source", "digest", "error")
+
+    def __init__(self, name: str, source: Any = None, digest: Optional[str] = None, error: Optional[str] = None):
+        self.name = name
+        self.source = source
+        self.digest = digest
+        self.error = error
+
+
+class BatchSpool:
+    """
+    Where the statements of a /parse-statements request wait for the workers.
+    Same rule as /parse-statement (files up to UPLOAD_SPOOL_LIMIT as bytes,
+    larger ones via a temp file), plus a cap on the request's total: once
+    memory_limit bytes are held, every further file goes to a temp file.
+    """
+
+    def __init__(self, memory_limit: int = BATCH_MEMORY_LIMIT):
+        self.memory_limit = memory_limit
+        self.held = 0
+        self.paths: List[str] = []
+
+    def read(self, src, size: Optional[int], name: str) -> BatchFile:
+        if size is not None and size <= UPLOAD_SPOOL_LIMIT and self.held + size <= self.memory_limit:
+            source = src.read()
+            self.held += len(source)
+            return BatchFile(name, source, hash_bytes(source))
+        path, digest = _save_upload(src, os.path.splitext(name)[1])
+        self.paths.append(path)
+        return BatchFile(name, path, digest)
+
+    def cleanup(self) -> None:
+        for path in self.paths:
+            os.remove(path)
+        self.paths.clear()
+
+
+def _check_batch_size(files: List[BatchFile]) -> None:
+    # checked before every file is read, so an archive with too many members is refused early
+    if len(files) >= BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many statements in one batch (limit {BATCH_MAX_FILES})")
+
+
+def _unpack_uploads(uploads: List[UploadFile], spool: BatchSpool) -> List[BatchFile]:
+    """
+    Statements of a batch upload: every .xls/.xlsx file, and every .xls/.xlsx
+    member of a .zip upload ("archive.zip/member.xlsx"). Anything else becomes
+    a per-file error instead of failing the batch.
+    """
+    files: List[BatchFile] = []
+    for upload in uploads:
+        name = upload.filename or "upload"
+        if name.lower().endswith(".zip"):
+            try:
+                with zipfile.ZipFile(upload.file) as archive:
+                    for info in archive.infolist():
+                        if info.is_dir() or not is_statement(info.filename):
+                            continue
+                        _check_batch_size(files)
+                        with archive.open(info) as member:
+                            files.append(spool.read(member, info.file_size, f"{name}/{info.filename}"))
+            except (zipfile.BadZipFile, zipfile.LargeZipFile) as e:
+                _check_batch_size(files)
+                files.append(BatchFile(name, error=f"Invalid zip archive: {e}"))
+        elif is_statement(name):
+            _check_batch_size(files)
+            files.append(spool.read(upload.file, upload.size, name))
+        else:
+            _check_batch_size(files)
+            files.append(BatchFile(name, error="Unsupported file type. Please upload .xls, .xlsx or .zip"))
+    return files
+
+
+async def _parse_chunk(chunk: List[BatchFile]) -> List[Tuple[BatchFile, bytes, bool]]:
+    # A failed job (busy pool, timeout, crash) fails only the files of its chunk
+    try:
+        results = await parse_pool.submit(call_target, BATCH_TARGET, [(f.name, f.source) for f in chunk])
+    except PoolSaturated:
+        return [(f, batch_record(f.name, None, "Parser is busy, retry later"), False) for f in chunk]
+    except JobTimeout as e:
+        return [(f, batch_record(f.name, None, f"Parsing timed out: {e}"), False) for f in chunk]
+    except Exception as e:
+        return [(f, batch_record(f.name, None, f"Error parsing statement: {e}"), False) for f in chunk]
+    records = []
+    for f, (name, body, error) in zip(chunk, results):
+        if body is not None:
+            await run_in_threadpool(result_cache.put, content_key(f.digest), body)
+        records.append((f, batch_record(name, body, error), error is None))
+    return records
+
+
+async def _run_batch(files: List[BatchFile]) -> AsyncIterator[Tuple[BatchFile, bytes, bool]]:
+    """
+    Per-file (file, record, ok) as they become available: errors and cache hits first,
+    then the parsed chunks in completion order. At most one chunk per worker
+    is in flight, so a large batch does not saturate the pool by itself.
+    """
+    misses: List[BatchFile] = []
+    for f in files:
+        if f.error is not None:
+            yield f, batch_record(f.name, None, f.error), False
+            continue
+        cached = await run_in_threadpool(result_cache.get, content_key(f.digest))
+        if cached is not None:
+            yield f, batch_record(f.name, cached, None), True
+        else:
+            misses.append(f)
+
+    limit = asyncio.Semaphore(parse_pool.workers)
+
+    async def run(chunk: List[BatchFile]) -> List[Tuple[BatchFile, bytes, bool]]:
+        async with limit:
+            return await _parse_chunk(chunk)
+
+    tasks = [asyncio.ensure_future(run(chunk)) for chunk in chunked(misses, BATCH_CHUNK)]
+    try:
+        for done in asyncio.as_completed(tasks):
+            for record in await done:
+                yield record
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+@app.post("/parse-statements")
+async def parse_statements(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    stream: bool = Query(False, description="Respond with NDJSON: one line per file as soon as it is parsed"),
+):
+    """
+    Upload many statements at once: several .xls/.xlsx files and/or .zip
+    archives of them. Files are fanned out over the worker pool in chunks.
+    Returns {"files": n, "failed": k, "results": [...]} in upload order, where
+    every entry is {"file": name, "result": {...}} or {"file": name, "error": "..."};
+    an error in one file does not abort the others. With `?stream=1` or
+    `Accept: application/x-ndjson` the entries are streamed as NDJSON in
+    completion order. Results are shared with the /parse-statement cache.
+    """
+    started = time.perf_counter()
+    timings = new_timings()
+    stream = stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+    spool = BatchSpool()
+    cleanup = spool.cleanup
+
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as tmp:
-            shutil.copyfileobj(file.file, tmp)
-            tmp_path = tmp.name
+        with timings.stage("upload") as stage:
+            batch = await run_in_threadpool(_unpack_uploads, files, spool)
+            stage.operations = len(batch)
+    except HTTPException:
+        cleanup()
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save uploaded file: {e}")
+        cleanup()
+        raise HTTPException(status_code=500, detail=f"Failed to read uploaded files: {e}")
+    finally:
+        for upload in files:
+            await upload.close()
+
+    if stream:
+        async def lines() -> AsyncIterator[bytes]:
+            try:
+                async for _, record, _ in _run_batch(batch):
+                    yield record + b"\n"
+            finally:
+                await run_in_threadpool(cleanup)
+
+        return _finish(StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE), timings, started)
+
+    records: Dict[int, bytes] = {}
+    failed = 0
+    try:
+        with timings.stage("parse"):
+            async for f, record, ok in _run_batch(batch):
+                records[id(f)] = record
+                failed += not ok
     finally:
-        file.file.close()
+        await run_in_threadpool(cleanup)
+    body = (b'{"files":' + str(len(batch)).encode() + b',"failed":' + str(failed).encode()
+            + b',"results":[' + b",".join(records[id(f)] for f in batch) + b"]}")
+    return _finish(Response(content=body, media_type="application/json"), timings, started)
 
-    # Parse the statement
+
+async def _run_job(job_id: str) -> None:
+    job = await run_in_threadpool(job_store.update, job_id, status=RUNNING, started_at=time.time())
+    source = job["input"]
     try:
-        result = parse_full_statement(tmp_path)
+        while True:
+            try:
+                operations = await parse_pool.submit(call_target, JOB_TARGET, source, job_store.directory, job_id,
+                                                     timeout=JOB_TIMEOUT)
+                break
+            except PoolSaturated:
+                # synchronous requests hold every slot: wait for one instead of failing the job
+                await asyncio.sleep(1)
+    except JobTimeout as e:
+        await run_in_threadpool(job_store.update, job_id, status=FAILED, finished_at=time.time(),
+                                error=f"Parsing timed out: {e}")
     except Exception as e:
-        # Clean up temp file
-        os.remove(tmp_path)
-        raise HTTPException(status_code=500, detail=f"Error parsing statement: {e}")
+        await run_in_threadpool(job_store.update, job_id, status=FAILED, finished_at=time.time(),
+                                error=f"Error parsing statement: {e}")
+    else:
+        await run_in_threadpool(job_store.update, job_id, status=DONE, finished_at=time.time(),
+                                operations=operations)
+        with open(job_store.result_path(job_id), "rb") as fh:
+            body = await run_in_threadpool(fh.read)
+        await run_in_threadpool(result_cache.put, content_key(job["digest"]), body)
+    finally:
+        os.remove(source)
+
+
+async def _dispatch_jobs() -> None:
+    # One dispatcher per worker process: jobs never queue inside the pool
+    while True:
+        job_id = await job_queue.get()
+        try:
+            await _run_job(job_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Job %s failed outside the parser", job_id)
 
-    # Clean up temp file
-    os.remove(tmp_path)
 
-    return JSONResponse(content=result)
+async def _purge_jobs() -> None:
+    while True:
+        await asyncio.sleep(max(60.0, job_store.ttl / 4))
+        try:
+            await run_in_threadpool(job_store.purge)
+        except Exception:
+            logger.exception("Purging expired jobs failed")
 
 
+def _job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    # Metadata as shown to clients: without the server-side input path
+    return {k: v for k, v in job.items() if k not in ("input", "digest")}
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(file: UploadFile = File(...)):
+    """
+    Queue an Excel statement (.xls or .xlsx) for parsing and return its job
+    id right away; poll `GET /jobs/{id}` and fetch `GET /jobs/{id}/result`.
+    Statements up to PARSER_JOB_SMALL_BYTES go to a priority lane. Responds
+    503 when the job queue is full. A statement already in the result cache
+    is finished immediately.
+    """
+    filename = file.filename
+    if not filename.lower().endswith(('.xls', '.xlsx')):
+        raise HTTPException(status_code=400, detail="Unsupported file type. Please upload .xls or .xlsx")
+    if job_queue.full:
+        raise HTTPException(status_code=503, detail="Job queue is full, retry later", headers={"Retry-After": "5"})
+
+    size = file.size if file.size is not None else 0
+    job = await run_in_threadpool(job_store.create, filename, SMALL if size <= JOB_SMALL_BYTES else LARGE, size)
+    job_id = job["id"]
+    try:
+        try:
+            path, digest = await run_in_threadpool(_save_upload, file.file, os.path.splitext(filename)[1],
+                                                   job_store.directory, job_id + ".input")
+        finally:
+            await file.close()
+        cached = await run_in_threadpool(result_cache.get, content_key(digest))
+        if cached is not None:
+            os.remove(path)
+            await run_in_threadpool(job_store.write_result, job_id, cached)
+            operations = len((await run_in_threadpool(json.loads, cached))["operations"])
+            job = await run_in_threadpool(job_store.update, job_id, status=DONE, started_at=time.time(),
+                                          finished_at=time.time(), operations=operations)
+        else:
+            job = await run_in_threadpool(job_store.update, job_id, input=path, digest=digest)
+            await job_queue.put(job_id, job["lane"])
+    except JobQueueFull:
+        await run_in_threadpool(job_store.remove, job_id)
+        raise HTTPException(status_code=503, detail="Job queue is full, retry later", headers={"Retry-After": "5"})
+    except Exception as e:
+        await run_in_threadpool(job_store.remove, job_id)
+        raise HTTPException(status_code=500, detail=f"Failed to queue statement: {e}")
+
+    view = _job_view(job)
+    view["position"] = job_queue.position(job_id)
+    return FastJSONResponse(view, status_code=202, headers={"Location": f"/jobs/{job_id}"})
+
+
+@app.get("/jobs/stats")
+async def job_stats():
+    """
+    Waiting jobs per lane and the queue limit.
+    """
+    return job_queue.stats()
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """
+    Status of a job (queued, running, done, failed), its place in the queue
+    while it waits, and its progress while it runs: the stage in progress and,
+    for every finished stage, its time, sheet rows and operations (the "fin",
+    "forex" and "stocks" stages are the three statement sections).
+    """
+    job = await run_in_threadpool(job_store.load, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    view = _job_view(job)
+    if job["status"] == QUEUED:
+        view["position"] = job_queue.position(job_id)
+    view["progress"] = await run_in_threadpool(job_store.progress, job_id)
+    return view
+
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    """
+    The result of a finished job, in the /parse-statement format.
+    Responds 409 while the job is queued or running and 422 when it failed.
+    """
+    job = await run_in_threadpool(job_store.load, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    if job["status"] == FAILED:
+        raise HTTPException(status_code=422, detail=job["error"])
+    if job["status"] != DONE:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return FileResponse(job_store.result_path(job_id), media_type="application/json")
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Hit/miss/eviction counters and current size of the result cache.
+    """
+    return result_cache.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Per-stage time, row and operation histograms in the Prometheus text format.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/healthz")
+async def healthz():
+    """
+    Liveness probe: the process is up and serving requests.
+    """
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """
+    Readiness probe: 200 once every worker has imported the parsers and
+    parsed the embedded self-check statement, 503 before that, on failure,
+    and while the pool is being rebuilt after a worker died.
+    """
+    task = _warm_up_task
+    if task is None or not task.done():
+        return FastJSONResponse({"status": "starting"}, status_code=503)
+    if task.cancelled() or task.exception() is not None:
+        error = "cancelled" if task.cancelled() else repr(task.exception())
+        return FastJSONResponse({"status": "failed", "error": error}, status_code=503)
+    if not parse_pool.ready:
+        return FastJSONResponse({"status": "restarting", "restarts": parse_pool.restarts}, status_code=503)
+    return {"status": "ready", "workers": parse_pool.workers, "restarts": parse_pool.restarts}
@@ -0,0 +1,234 @@
+# metrics.py
+
+import bisect
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from settings import env_bool
+
+# Stage timings are collected unless PARSER_METRICS=0
+METRICS_ENABLED = env_bool("PARSER_METRICS", True)
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000)
+
+
+@dataclass
+class Stage:
+    name: str
+    seconds: float = 0.0
+    rows: Optional[int] = None
+    operations: Optional[int] = None
+
+
+class _StageContext:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: Stage):
+        self.stage = stage
+
+    def __enter__(self) -> Stage:
+        self.started = time.perf_counter()
+        return self.stage
+
+    def __exit__(self, *exc: Any) -> bool:
+        self.stage.seconds += time.perf_counter() - self.started
+        return False
+
+
+class StageTimings:
+    """
+    Per-request breakdown: stage name -> seconds, rows and operations, in the
+    order the stages ran. Picklable, so worker processes can send it back.
+    """
+    enabled = True
+
+    def __init__(self):
+        self.stages: Dict[str, Stage] = {}
+
+    def stage(self, name: str) -> _StageContext:
+        """Context manager timing one stage; set .rows/.operations on the yielded Stage."""
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = Stage(name)
+        return _StageContext(stage)
+
+    def add(self, name: str, seconds: float, rows: Optional[int] = None,
+            operations: Optional[int] = None) -> None:
+        self.stages[name] = Stage(name, seconds, rows, operations)
+
+    def merge(self, other: "StageTimings") -> None:
+        for name, stage in other.stages.items():
+            self.stages.setdefault(name, stage)
+
+    def __iter__(self) -> Iterator[Stage]:
+        return iter(self.stages.values())
+
+    def server_timing(self) -> str:
+        """Server-Timing header value (durations in milliseconds)."""
+        return ", ".join(f"{s.name};dur={s.seconds * 1000:.1f}" for s in self)
+
+
+class _ReportingContext(_StageContext):
+    __slots__ = ("timings",)
+
+    def __init__(self, stage: Stage, timings: "ReportingTimings"):
+        super().__init__(stage)
+        self.timings = timings
+
+    def __enter__(self) -> Stage:
+        stage = super().__enter__()
+        self.timings.running = stage.name
+        self.timings.report(self.timings)
+        return stage
+
+    def __exit__(self, *exc: Any) -> bool:
+        super().__exit__(*exc)
+        self.timings.running = None
+        self.timings.report(self.timings)
+        return False
+
+
+class ReportingTimings(StageTimings):
+    """
+    StageTimings that calls report(timings) whenever a stage starts or ends,
+    e.g. to publish the progress of a long-running job. running holds the
+    name of the stage in progress.
+    """
+
+    def __init__(self, report: Callable[["ReportingTimings"], None]):
+        super().__init__()
+        self.report = report
+        self.running: Optional[str] = None
+
+    def stage(self, name: str) -> _ReportingContext:
+        return _ReportingContext(super().stage(name).stage, self)
+
+    def add(self, name: str, seconds: float, rows: Optional[int] = None,
+            operations: Optional[int] = None) -> None:
+        super().add(name, seconds, rows, operations)
+        self.report(self)
+
+
+class _NullContext:
+    __slots__ = ()
+    _stage = Stage("null")
+
+    def __enter__(self) -> Stage:
+        return self._stage
+
+    def __exit__(self, *exc: Any) -> bool:
+        return False
+
+
+class _NullTimings(StageTimings):
+    """Disabled timings: stage() is a shared no-op, nothing is recorded."""
+    enabled = False
+    _context = _NullContext()
+
+    def stage(self, name: str) -> _NullContext:
+        return self._context
+
+    def add(self, name: str, seconds: float, rows: Optional[int] = None,
+            operations: Optional[int] = None) -> None:
+        pass
+
+
+NULL_TIMINGS: StageTimings = _NullTimings()
+
+
+def new_timings() -> StageTimings:
+    return StageTimings() if METRICS_ENABLED else NULL_TIMINGS
+
+
+class Histogram:
+    """Prometheus histogram with one label (thread-safe)."""
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float], label: str = "stage"):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.label = label
+        self._series: Dict[str, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float) -> None:
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1][0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for value, (counts, total) in sorted(self._series.items()):
+                label = f'{self.label}="{value}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+                cumulative += counts[-1]
+                lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {cumulative}')
+                lines.append(f"{self.name}_sum{{{label}}} {total[0]}")
+                lines.append(f"{self.name}_count{{{label}}} {cumulative}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("statement_stage_seconds", "Time spent in each parsing stage.", TIME_BUCKETS)
+STAGE_ROWS = Histogram("statement_stage_rows", "Sheet rows handled by each parsing stage.", COUNT_BUCKETS)
+STAGE_OPERATIONS = Histogram("statement_stage_operations", "Operations produced by each parsing stage.",
+                             COUNT_BUCKETS)
+HISTOGRAMS = [STAGE_SECONDS, STAGE_ROWS, STAGE_OPERATIONS]
+
+
+def observe_timings(timings: StageTimings) -> None:
+    for stage in timings:
+        STAGE_SECONDS.observe(stage.name, stage.seconds)
+        if stage.rows is not None:
+            STAGE_ROWS.observe(stage.name, stage.rows)
+        if stage.operations is not None:
+            STAGE_OPERATIONS.observe(stage.name, stage.operations)
+
+
+def render_metrics() -> str:
+    """All histograms in the Prometheus text exposition format."""
+    return "\n".join(line for h in HISTOGRAMS for line in h.render()) + "\n"
+
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+
+def profile_call(out_dir: str, name: str, profiler: str, fn: Callable, *args: Any) -> Tuple[Any, str]:
+    """
+    Runs fn(*args) under cProfile (.prof dump) or pyinstrument (.html report)
+    and writes the result to out_dir. Returns (fn's result, report path).
+    Module-level so it can be submitted to the parse pool.
+    """
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler: {profiler}")
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S") + f".{time.time_ns() // 1_000_000 % 1000:03d}"
+    if profiler == "pyinstrument":
+        from pyinstrument import Profiler
+        prof = Profiler()
+        prof.start()
+        try:
+            result = fn(*args)
+        finally:
+            prof.stop()
+        path = os.path.join(out_dir, f"{name}-{stamp}.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(prof.output_html())
+        return result, path
+
+    import cProfile
+    prof = cProfile.Profile()
+    result = prof.runcall(fn, *args)
+    path = os.path.join(out_dir, f"{name}-{stamp}.prof")
+    prof.dump_stats(path)
+    return result, path
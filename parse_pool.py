@@ -0,0 +1,210 @@
+# parse_pool.py
+
+import asyncio
+import importlib
+import logging
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from settings import env_float, env_int
+
+logger = logging.getLogger(__name__)
+
+# Seconds a warm-up ping holds its worker
+WARM_UP_HOLD = 0.05
+
+
+class PoolSaturated(Exception):
+    """Raised when the number of queued and running jobs reached the limit."""
+
+
+class JobTimeout(Exception):
+    """Raised when a job did not finish within the per-job timeout."""
+
+
+def _init_worker() -> None:
+    """
+    Runs once in every worker process: import the heavy parsing stack
+    (pandas, xlrd, openpyxl, parsers) and parse a tiny embedded statement
+    before the first job arrives. A failure here breaks the pool, so
+    warm_up() never reports a worker that cannot parse as ready.
+    """
+    import full_statement
+    import openpyxl  # noqa: F401
+    import xlrd  # noqa: F401
+    full_statement.self_check()
+
+
+def call_target(target: str, *args: Any) -> Any:
+    """
+    Run the "module:function" target with args. Lets the API submit parser
+    jobs by name without importing the parsing stack in its own process.
+    """
+    module, name = target.split(":")
+    return getattr(importlib.import_module(module), name)(*args)
+
+
+def _ping(hold: float = 0.0) -> int:
+    # holding the worker a little keeps one fast worker from answering every ping
+    time.sleep(hold)
+    return os.getpid()
+
+
+def _call_with_deadline(seconds: float, fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    Worker side of a job: run fn(*args), raising JobTimeout inside the
+    worker once it ran for seconds, and again every second after that in
+    case a parser swallowed it. The client-side timeout alone would leave
+    the job running and holding its worker after the 504.
+    Needs SIGALRM (POSIX); elsewhere the job runs to completion.
+    """
+    if not hasattr(signal, "setitimer"):
+        return fn(*args)
+
+    def expire(signum, frame):
+        raise JobTimeout(f"job exceeded {seconds:g}s")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds, 1.0)
+    try:
+        return fn(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+class ParsePool:
+    """
+    Process pool for CPU-bound statement parsing.
+
+    - workers:     number of worker processes (PARSER_WORKERS, default: CPU count)
+    - max_pending: queued + running jobs allowed before submit() raises
+                   PoolSaturated (PARSER_MAX_PENDING, default: 4 * workers)
+    - timeout:     seconds a single job may take before submit() raises
+                   JobTimeout (PARSER_JOB_TIMEOUT, default: 60)
+
+    A worker that dies breaks the whole executor; the pool then replaces it
+    (restarts counts how often) and is not ready until the new workers
+    are warm.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 timeout: Optional[float] = None):
+        self.workers = workers or env_int("PARSER_WORKERS", os.cpu_count() or 1)
+        self.max_pending = max_pending or env_int("PARSER_MAX_PENDING", 4 * self.workers)
+        self.timeout = timeout or env_float("PARSER_JOB_TIMEOUT", 60.0)
+        self.pending = 0
+        self.ready = False
+        self.restarts = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._rebuild_task: Optional[asyncio.Task] = None
+
+    def start(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        return self._executor
+
+    async def warm_up(self) -> None:
+        """
+        Start the pool and make sure every worker has been spawned and has
+        run the initializer, so the first request does not pay for imports.
+        Sets ready once pings were answered by `workers` distinct processes:
+        the same number of answered pings could come from one fast worker
+        while the others still import.
+        """
+        executor = self.start()
+        loop = asyncio.get_running_loop()
+        pids = set()
+        try:
+            while len(pids) < self.workers:
+                pids.update(await asyncio.gather(*(loop.run_in_executor(executor, _ping, WARM_UP_HOLD)
+                                                   for _ in range(self.workers))))
+        except BrokenProcessPool:
+            if executor is not self._executor:
+                return  # replaced while warming up; the new executor warms up itself
+            raise
+        if executor is self._executor:
+            self.ready = True
+
+    def _recycle(self, executor: ProcessPoolExecutor) -> None:
+        """
+        Replace a broken executor (a worker died: killed, out of memory,
+        crashed in native code) with a fresh one and warm it up in the
+        background; ready stays False until that finishes. Jobs that hit
+        the same broken executor recycle it only once.
+        """
+        if executor is not self._executor:
+            return
+        self.ready = False
+        self.restarts += 1
+        self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+        logger.warning("Parser worker died, restarting the process pool")
+        self._rebuild_task = asyncio.ensure_future(self.warm_up())
+        self._rebuild_task.add_done_callback(self._log_rebuild)
+
+    @staticmethod
+    def _log_rebuild(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Parser pool restart failed", exc_info=task.exception())
+
+    def shutdown(self) -> None:
+        self.ready = False
+        if self._rebuild_task is not None:
+            self._rebuild_task.cancel()
+            self._rebuild_task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def saturated(self) -> bool:
+        return self.pending >= self.max_pending
+
+    def _release(self) -> None:
+        self.pending -= 1
+
+    async def submit(self, fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+        """
+        Run fn(*args) in a worker process without blocking the event loop.
+        timeout overrides the pool's per-job timeout for this job.
+        A queued job that times out is cancelled; a running one is stopped
+        inside its worker when it reaches the timeout (see
+        _call_with_deadline) and counts as pending until then.
+        When a worker dies, the pool is rebuilt and the job is submitted once
+        more; BrokenProcessPool is raised if it dies again.
+        """
+        if self.saturated:
+            raise PoolSaturated(f"{self.pending} jobs pending (limit {self.max_pending})")
+        timeout = timeout or self.timeout
+        for attempt in range(2):
+            executor = self.start()
+            try:
+                return await self._run(executor, timeout, fn, args)
+            except BrokenProcessPool:
+                self._recycle(executor)
+                if attempt:
+                    raise
+
+    async def _run(self, executor: ProcessPoolExecutor, timeout: float, fn: Callable[..., Any],
+                   args: tuple) -> Any:
+        loop = asyncio.get_running_loop()
+        job = executor.submit(_call_with_deadline, timeout, fn, *args)
+        self.pending += 1
+
+        def on_done(_):
+            try:
+                loop.call_soon_threadsafe(self._release)
+            except RuntimeError:
+                # event loop is already closed (shutdown)
+                pass
+
+        job.add_done_callback(on_done)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(job), timeout)
+        except asyncio.TimeoutError:
+            raise JobTimeout(f"job exceeded {timeout:g}s") from None
@@ -0,0 +1,142 @@
+# reader.py
+
+import io
+import os
+from datetime import time
+from typing import Any, Iterator, List
+
+#  Сигнатуры файлов: .xls — OLE2-контейнер, .xlsx — zip-архив
+_XLS_MAGIC = b"\xd0\xcf\x11\xe0"
+_XLSX_MAGIC = b"PK"
+
+ENGINES = ("pandas", "native")
+DEFAULT_ENGINE = os.environ.get("STATEMENT_READER_ENGINE", "pandas")
+
+
+def detect_format(source: Any) -> str:
+    """
+    Определяет формат книги по первым байтам: 'xls' или 'xlsx'.
+    Для путей без узнаваемой сигнатуры смотрит на расширение.
+    """
+    if hasattr(source, "read"):
+        pos = source.tell()
+        head = source.read(8)
+        source.seek(pos)
+    else:
+        with open(source, "rb") as fh:
+            head = fh.read(8)
+
+    if head.startswith(_XLS_MAGIC):
+        return "xls"
+    if head.startswith(_XLSX_MAGIC):
+        return "xlsx"
+    name = str(getattr(source, "name", source)).lower()
+    return "xlsx" if name.endswith((".xlsx", ".xlsm")) else "xls"
+
+
+def _xls_cell(value: Any, cell_type: int, epoch1904: bool) -> Any:
+    """
+    Значение ячейки xlrd, приведённое так же, как это делает pd.read_excel.
+    """
+    import xlrd
+
+    if cell_type == xlrd.XL_CELL_DATE:
+        try:
+            value = xlrd.xldate.xldate_as_datetime(value, 1 if epoch1904 else 0)
+        except OverflowError:
+            return value
+        # даты «на эпохе» в Excel означают время без даты
+        day = value.timetuple()[0:3]
+        if (not epoch1904 and day == (1899, 12, 31)) or (epoch1904 and day == (1904, 1, 1)):
+            value = time(value.hour, value.minute, value.second, value.microsecond)
+    elif cell_type == xlrd.XL_CELL_ERROR:
+        return None
+    elif cell_type == xlrd.XL_CELL_BOOLEAN:
+        return bool(value)
+    elif cell_type == xlrd.XL_CELL_NUMBER:
+        if value.is_integer():
+            return int(value)
+    elif value == "":
+        return None
+    return value
+
+
+def _iter_xls_rows(source: Any) -> Iterator[list]:
+    import xlrd
+
+    if isinstance(source, io.BytesIO):
+        # getvalue() у BytesIO не копирует буфер
+        book = xlrd.open_workbook(file_contents=source.getvalue(), on_demand=True)
+    elif hasattr(source, "read"):
+        book = xlrd.open_workbook(file_contents=source.read(), on_demand=True)
+    else:
+        book = xlrd.open_workbook(source, on_demand=True)
+    try:
+        sheet = book.sheet_by_index(0)
+        epoch1904 = bool(book.datemode)
+        text, number, empty, blank = xlrd.XL_CELL_TEXT, xlrd.XL_CELL_NUMBER, xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK
+        for i in range(sheet.nrows):
+            row = []
+            for v, t in zip(sheet.row_values(i), sheet.row_types(i)):
+                # частые типы — без вызова функции на ячейку
+                if t == text:
+                    row.append(v or None)
+                elif t == number:
+                    row.append(int(v) if v.is_integer() else v)
+                elif t == empty or t == blank:
+                    row.append(None)
+                else:
+                    row.append(_xls_cell(v, t, epoch1904))
+            yield row
+    finally:
+        book.release_resources()
+
+
+def _xlsx_cell(value: Any) -> Any:
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if value == "":
+        return None
+    return value
+
+
+def _iter_xlsx_rows(source: Any) -> Iterator[list]:
+    import openpyxl
+
+    book = openpyxl.load_workbook(source, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheet = book.worksheets[0]
+        sheet.reset_dimensions()
+        for row in sheet.iter_rows(values_only=True):
+            cells = [_xlsx_cell(v) for v in row]
+            # как и pandas, отрезаем пустой хвост строки
+            while cells and cells[-1] is None:
+                cells.pop()
+            yield cells
+    finally:
+        book.close()
+
+
+def iter_rows(source: Any) -> Iterator[list]:
+    """
+    Строки первого листа по одной, по мере чтения книги (значения — как
+    в read_rows). .xlsx читается потоково (openpyxl read_only): в памяти
+    только текущая строка и таблица общих строк книги. .xls — через xlrd
+    on_demand: лист xlrd загружает целиком, но формат ограничен 65536 строками.
+    """
+    if detect_format(source) == "xlsx":
+        return _iter_xlsx_rows(source)
+    return _iter_xls_rows(source)
+
+
+def read_rows(source: Any) -> List[list]:
+    """
+    Читает первый лист книги в список строк (списков значений) без pandas:
+    .xls — через xlrd (on_demand), .xlsx — через openpyxl в режиме read_only.
+    Пустые ячейки -> None, целые числа -> int, как в pd.read_excel.
+    """
+    rows = list(iter_rows(source))
+    # как и pandas, отрезаем пустые строки в конце листа
+    while rows and not rows[-1]:
+        rows.pop()
+    return rows
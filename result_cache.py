@@ -0,0 +1,136 @@
+# result_cache.py
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from constants import PARSER_VERSION
+from fileio import write_atomic
+from settings import env_float, env_int
+
+
+def content_key(digest: str, version: str = PARSER_VERSION) -> str:
+    """
+    Cache key for a statement: sha256 of the file bytes plus parser version,
+    so a parser upgrade never serves results of the previous one.
+    """
+    return f"v{version}-{digest}"
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache of serialized parse results keyed by content_key().
+
+    - memory tier: LRU bounded by max_entries (PARSER_CACHE_ENTRIES, default 256)
+      and max_bytes (PARSER_CACHE_BYTES, default 256 MiB)
+    - disk tier:   one file per key in disk_dir (PARSER_CACHE_DIR, disabled
+      when unset); survives restarts, expired files are removed on read
+    - ttl:         seconds an entry stays valid in both tiers
+      (PARSER_CACHE_TTL, default 3600; 0 disables expiry)
+
+    Values are opaque bytes (the rendered JSON response), so a hit costs
+    neither parsing nor serialization.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 ttl: Optional[float] = None, disk_dir: Optional[str] = None):
+        self.max_entries = env_int("PARSER_CACHE_ENTRIES", 256) if max_entries is None else max_entries
+        self.max_bytes = env_int("PARSER_CACHE_BYTES", 256 * 1024 * 1024) if max_bytes is None else max_bytes
+        self.ttl = env_float("PARSER_CACHE_TTL", 3600.0) if ttl is None else ttl
+        self.disk_dir = disk_dir if disk_dir is not None else os.environ.get("PARSER_CACHE_DIR") or None
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl > 0 and time.time() - stored_at > self.ttl
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _remember(self, key: str, stored_at: float, value: bytes) -> None:
+        # caller holds the lock
+        if len(value) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old[1])
+        self._entries[key] = (stored_at, value)
+        self._bytes += len(value)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    def _read_disk(self, key: str) -> Optional[Tuple[float, bytes]]:
+        path = self._disk_path(key)
+        try:
+            stored_at = os.path.getmtime(path)
+            if self._expired(stored_at):
+                os.remove(path)
+                return None
+            with open(path, "rb") as fh:
+                return stored_at, fh.read()
+        except FileNotFoundError:
+            return None
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Stored value or None. Disk hits are promoted to the memory tier.
+        May touch the disk: call it off the event loop when disk_dir is set.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self._bytes -= len(entry[1])
+
+        entry = self._read_disk(key) if self.disk_dir else None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self._remember(key, *entry)
+            self.hits += 1
+            self.disk_hits += 1
+            return entry[1]
+
+    def put(self, key: str, value: bytes) -> None:
+        with self._lock:
+            self._remember(key, time.time(), value)
+        if self.disk_dir:
+            write_atomic(self._disk_path(key), value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
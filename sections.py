@@ -0,0 +1,139 @@
+# sections.py
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import pandas as pd
+
+from constants import (
+    CASH_HEADER_KEYWORDS,
+    CURRENCY_DICT,
+    FOREX_BLOCK_ANCHOR,
+    FOREX_HEADER_KEYWORDS,
+    TOTAL_KEYWORD,
+    TRADE_HEADER_KEYWORDS,
+    TRADE_SECTION_KEYWORDS,
+    TRADES_BLOCK_ANCHOR,
+)
+
+
+@dataclass
+class TradeSection:
+    """
+    Подраздел блока «2.1. Сделки» (акции/АДР или облигации).
+    start  — строка с названием подраздела,
+    end    — первая строка следующего подраздела (не включительно),
+    header — строка заголовков таблицы или None.
+    """
+    kind: str
+    start: int
+    end: int
+    header: Optional[int] = None
+
+
+@dataclass
+class SectionIndex:
+    """
+    Индекс якорей выписки. Все номера строк — позиции в листе (iloc).
+    """
+    texts: List[str]
+    blank: List[bool]
+    currency_rows: Dict[int, str] = field(default_factory=dict)
+    totals: Set[int] = field(default_factory=set)
+    cash_header: Optional[int] = None
+    forex_start: Optional[int] = None
+    forex_header: Optional[int] = None
+    trades_start: Optional[int] = None
+    trade_sections: List[TradeSection] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def next_blank(self, start: int, stop: int) -> int:
+        """
+        Первая пустая строка в [start, stop) или stop, если таких нет.
+        """
+        for i in range(start, stop):
+            if self.blank[i]:
+                return i
+        return stop
+
+
+def has_all(text: str, keywords: List[str]) -> bool:
+    return all(k in text for k in keywords)
+
+
+def is_cell_header(cells: Iterable[Any], text: str, required: List[str]) -> bool:
+    """
+    Строка — заголовок таблицы: каждый required встречается в какой-то
+    ячейке (cells — непустые ячейки строки, text — их склеенный текст
+    в нижнем регистре). Текст отсекает заведомо неподходящие строки без
+    разбора ячеек.
+    """
+    if not has_all(text, required):
+        return False
+    lowered = [str(c).lower() for c in cells]
+    return all(any(req in cell for cell in lowered) for req in required)
+
+
+def _find_cell_header(values, present, texts: List[str], start: int, stop: int,
+                      required: List[str]) -> Optional[int]:
+    """
+    Первая строка в [start, stop), которая is_cell_header.
+    """
+    for i in range(start, stop):
+        if has_all(texts[i], required) and is_cell_header(values[i][present[i]], texts[i], required):
+            return i
+    return None
+
+
+def build_section_index(df: pd.DataFrame) -> SectionIndex:
+    """
+    Один проход по листу: каждая строка склеивается и приводится
+    к нижнему регистру один раз, по ней отмечаются все якоря.
+    """
+    values = df.to_numpy(dtype=object)
+    present = pd.notna(values)
+
+    texts: List[str] = []
+    blank: List[bool] = []
+    index = SectionIndex(texts=texts, blank=blank)
+    section_rows = []
+
+    for i in range(len(values)):
+        row_str = " ".join(str(c) for c in values[i][present[i]])
+        text = row_str.lower()
+        texts.append(text)
+
+        stripped = row_str.strip()
+        blank.append(not stripped)
+        if stripped in CURRENCY_DICT:
+            index.currency_rows[i] = CURRENCY_DICT[stripped]
+
+        if TOTAL_KEYWORD in text:
+            index.totals.add(i)
+
+        if index.cash_header is None and has_all(text, CASH_HEADER_KEYWORDS):
+            index.cash_header = i
+
+        if index.forex_start is None:
+            if FOREX_BLOCK_ANCHOR in text:
+                index.forex_start = i + 1
+        elif index.forex_header is None and has_all(text, FOREX_HEADER_KEYWORDS):
+            index.forex_header = i
+
+        if index.trades_start is None:
+            if TRADES_BLOCK_ANCHOR in text:
+                index.trades_start = i + 1
+        else:
+            for kind, keywords in TRADE_SECTION_KEYWORDS.items():
+                if any(k in text for k in keywords):
+                    section_rows.append((i, kind))
+                    break
+
+    bounds = [row for row, _ in section_rows] + [len(values)]
+    for (start, kind), end in zip(section_rows, bounds[1:]):
+        header = _find_cell_header(values, present, texts, start + 1, end, TRADE_HEADER_KEYWORDS[kind])
+        index.trade_sections.append(TradeSection(kind=kind, start=start, end=end, header=header))
+
+    return index
@@ -1,11 +1,23 @@
+import numpy as np
 import pandas as pd
-import re
-import json
-from datetime import datetime
-from typing import List, Any, Optional, Union
-
-from OperationDTO import OperationDTO
-from utils import to_num, find_column_index
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, Optional, Tuple
+
+from OperationDTO import OperationBatch
+from classifier import (
+    ROW_BLANK,
+    ROW_HEADER,
+    ROW_TICKER,
+    ROW_TOTAL,
+    classify_rows,
+    is_ticker_text,
+    parse_ticker_and_isin,
+)
+from constants import HEADER_VARIATIONS_TRADES, TRADE_HEADER_KEYWORDS
+from dates import format_timestamp, parse_datetime_columns
+from layout import ColumnRule, LayoutSpec, resolve_layout
+from utils import to_num_column
+from workbook import StatementSource, load_statement
 
 
 # --- Парсинг тикера и ISIN из одной строки ---
@@ -13,188 +25,180 @@ def parse_ticker_and_isin_row(row: List[Any]) -> tuple[str, str]:
     """
     Извлекает ticker и ISIN из строки над сделками, например:
     """
-    text = " ".join(str(c).strip() for c in row if pd.notna(c))
-    match = re.search(r"^(?P<ticker>\S+).*?ISIN[:\s]*(?P<isin>[A-Z0-9]{12})", text)
-    if match:
-        return match.group("ticker"), match.group("isin")
-    return "", ""
+    return parse_ticker_and_isin(" ".join(str(c).strip() for c in row if pd.notna(c)))
 
 
 def is_ticker_row(row: List[Any]) -> bool:
-    return any(
-        isinstance(cell, str) and any(keyword in cell.lower() for keyword in ['номер рег', 'isin'])
-        for cell in row
+    return any(isinstance(cell, str) and is_ticker_text(cell) for cell in row)
+
+
+#  Ключ колонки подраздела -> поле HEADER_VARIATIONS_TRADES с запасными названиями
+TRADE_VARIATION_FIELDS = {
+    'num': 'operation_id',
+    'buy_qty': 'buy_quantity',
+    'sell_qty': 'sell_quantity',
+    'buy_sum': 'buy_payment',
+    'sell_sum': 'sell_revenue',
+    'currency': 'currency',
+    'date': 'date',
+    'time': 'time',
+    'aci_buy': 'aci',
+    'aci_sell': 'aci',
+    'buy_pr': 'price',
+    'sell_pr': 'price',
+}
+
+
+@dataclass(frozen=True)
+class TradeSectionSpec:
+    """
+    Описание колонок подраздела сделок: ключ -> keywords (все должны входить
+    в название колонки). Колонки 'aci_buy'/'aci_sell' и 'time' есть не во всех
+    подразделах. Цены покупки и продажи — первая и вторая колонки «цена».
+    layout — раскладка для layout.resolve_layout, строится по columns.
+    """
+    kind: str
+    columns: Dict[str, Tuple[str, ...]]
+    layout: LayoutSpec = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        rules = {key: ColumnRule(keys, variation=TRADE_VARIATION_FIELDS.get(key))
+                 for key, keys in self.columns.items()}
+        rules['buy_pr'] = ColumnRule(('цена',), variation='price')
+        rules['sell_pr'] = ColumnRule(('цена',), occurrence=1, variation='price')
+        object.__setattr__(self, 'layout', LayoutSpec(self.kind, rules, HEADER_VARIATIONS_TRADES.get(self.kind, {})))
+
+
+SECTION_SPECS: Dict[str, TradeSectionSpec] = {
+    'stock': TradeSectionSpec('stock', {
+        'num':      ('номер',),
+        'buy_qty':  ('куплено',),
+        'sell_qty': ('продано',),
+        'buy_sum':  ('сумма', 'платеж'),
+        'sell_sum': ('сумма', 'выруч'),
+        'currency': ('валюта',),
+        'date':     ('дата соверш',),
+        'time':     ('время соверш',),
+    }),
+    'bond': TradeSectionSpec('bond', {
+        'num':      ('номер',),
+        'buy_qty':  ('куплено',),
+        'sell_qty': ('продано',),
+        'buy_sum':  ('сумма', 'платеж'),
+        'sell_sum': ('сумма', 'выруч'),
+        'currency': ('валюта',),
+        'date':     ('совершена',),
+        'aci_buy':  ('нкд', 'покупки'),
+        'aci_sell': ('нкд', 'продажи'),
+    }),
+}
+
+
+def _dayfirst_fallback(date_text: str, _: Optional[str], time_text: str) -> Optional[str]:
+    # запись не по шаблону ДД.ММ.ГГ ЧЧ:ММ:СС — общий разбор, как раньше
+    return format_timestamp(pd.to_datetime(f"{date_text} {time_text}", dayfirst=True, errors='coerce'))
+
+
+def parse_trade_section(block: pd.DataFrame, spec: TradeSectionSpec, hdr_idx: Optional[int] = None) -> List[dict]:
+    return parse_trade_section_batch(block, spec, hdr_idx).to_dicts()
+
+
+def parse_trade_section_batch(block: pd.DataFrame, spec: TradeSectionSpec,
+                              hdr_idx: Optional[int] = None) -> OperationBatch:
+    """
+    Колоночный разбор подраздела сделок по спецификации колонок.
+    """
+    if hdr_idx is None:
+        headers = np.flatnonzero(classify_rows(block, TRADE_HEADER_KEYWORDS[spec.kind]) == ROW_HEADER)
+        if not len(headers):
+            return OperationBatch.empty()
+        hdr_idx = int(headers[0])
+
+    # строки после заголовка до первой пустой
+    body = block.iloc[hdr_idx+1:]
+    kinds = classify_rows(body)
+    blank = kinds == ROW_BLANK
+    if blank.any():
+        stop = int(blank.argmax())
+        body, kinds = body.iloc[:stop], kinds[:stop]
+    total, ticker = kinds == ROW_TOTAL, kinds == ROW_TICKER
+
+    # тикер/ISIN из строк-заголовков инструмента «разливаются» на сделки ниже
+    instruments = pd.Series([None] * len(body), dtype=object)
+    for pos in np.flatnonzero(ticker):
+        instruments.iat[pos] = parse_ticker_and_isin_row(list(body.iloc[pos]))
+    instruments = instruments.ffill()
+
+    trades = ~(total | ticker)
+    data = body[trades]
+    instruments = instruments[trades].tolist()
+    if data.empty:
+        return OperationBatch.empty()
+
+    # индексы колонок (раскладка шаблона кэшируется по отпечатку заголовков)
+    idx = resolve_layout(spec.layout, block.iloc[hdr_idx]).columns
+
+    def column(key: str) -> pd.Series:
+        return data.iloc[:, idx[key]]
+
+    time = column('time').astype(str) if 'time' in idx else '00:00:00'
+    dts, _ = parse_datetime_columns(column('date').astype(str), time, fallback=_dayfirst_fallback)
+
+    buy = to_num_column(column('buy_qty'))
+    sell = to_num_column(column('sell_qty'))
+    is_buy = buy > 0
+    keep = pd.notna(dts) & (is_buy | (sell > 0))
+
+    def pick(buy_key: str, sell_key: str) -> np.ndarray:
+        if buy_key not in idx:
+            return np.zeros(len(data))
+        return np.where(is_buy, to_num_column(column(buy_key)), to_num_column(column(sell_key)))
+
+    tickers = [inst[0] if inst else '' for inst in instruments]
+    isins = [inst[1] if inst else '' for inst in instruments]
+
+    return OperationBatch.from_columns(
+        int(keep.sum()),
+        date=dts[keep],
+        operation_type=np.where(is_buy, 'buy', 'sell')[keep].astype(object),
+        payment_sum=pick('buy_sum', 'sell_sum')[keep],
+        currency=column('currency').astype(str).str.strip()[keep],
+        ticker=[t for t, k in zip(tickers, keep) if k],
+        isin=[i for i, k in zip(isins, keep) if k],
+        price=pick('buy_pr', 'sell_pr')[keep],
+        quantity=np.where(is_buy, buy, sell)[keep].astype(int),
+        aci=pick('aci_buy', 'aci_sell')[keep],
+        comment='',
+        operation_id=column('num').astype(str).str.strip()[keep],
     )
 
 
-def find_block_start(df: pd.DataFrame, keyword: str) -> Optional[int]:
-    for i, row in df.iterrows():
-        if keyword in ' '.join(str(c).lower() for c in row if pd.notna(c)):
-            return i + 1
-    return None
+def parse_stock_section(block: pd.DataFrame, hdr_idx: Optional[int] = None) -> List[dict]:
+    return parse_trade_section(block, SECTION_SPECS['stock'], hdr_idx)
 
 
-def find_header_row(df: pd.DataFrame, required: List[str]) -> Optional[int]:
-    for i, row in df.iterrows():
-        cells = [str(c).lower() for c in row if pd.notna(c)]
-        if all(any(req in cell for cell in cells) for req in required):
-            return i
-    return None
+def parse_bond_section(block: pd.DataFrame, hdr_idx: Optional[int] = None) -> List[dict]:
+    return parse_trade_section(block, SECTION_SPECS['bond'], hdr_idx)
 
 
+def parse_stock_bond_trades(file_path: StatementSource) -> List[dict]:
+    return parse_stock_bond_trades_batch(file_path).to_dicts()
 
-def parse_stock_section(block: pd.DataFrame) -> List[dict]:
-    results: List[dict] = []
-    required = ['дата', 'номер', 'куплено', 'продано', 'сумма', 'валюта', 'дата соверш', 'время соверш']
-    hdr_idx = find_header_row(block, required)
-    if hdr_idx is None:
-        return results
-    headers = block.iloc[hdr_idx].astype(str).str.lower().tolist()
-
-    idx = {
-        'num':     find_column_index(headers, 'номер'),
-        'buy_qty': find_column_index(headers, 'куплено'),
-        'sell_qty':find_column_index(headers, 'продано'),
-        'buy_sum': find_column_index(headers, 'сумма', 'платеж'),
-        'sell_sum':find_column_index(headers, 'сумма', 'выруч'),
-        'currency':find_column_index(headers, 'валюта'),
-        'date':    find_column_index(headers, 'дата соверш'),
-        'time':    find_column_index(headers, 'время соверш'),
-    }
-    price_cols = [i for i, h in enumerate(headers) if 'цена' in h]
-    idx['buy_pr'], idx['sell_pr'] = (price_cols + [None, None])[:2]
-
-    curr_ticker, curr_isin = '', ''
-    for row in block.iloc[hdr_idx+1:].itertuples(index=False):
-        cells = list(row)
-        if all(pd.isna(c) or (isinstance(c, str) and not c.strip()) for c in cells):
-            break
-        if any(isinstance(c, str) and c.lower().startswith('итого') for c in cells):
-            continue
-        if is_ticker_row(cells):
-            curr_ticker, curr_isin = parse_ticker_and_isin_row(cells)
-            continue
-        dt = pd.to_datetime(
-            f"{cells[idx['date']]} {cells[idx['time']]}", dayfirst=True, errors='coerce'
-        )
-        if pd.isna(dt):
-            continue
 
-        buy = to_num(cells[idx['buy_qty']])
-        sell = to_num(cells[idx['sell_qty']])
-        if buy > 0:
-            op, qty, pr, total, aci = 'buy', buy, to_num(cells[idx['buy_pr']]), to_num(cells[idx['buy_sum']]), 0.0
-        elif sell > 0:
-            op, qty, pr, total, aci = 'sell', sell, to_num(cells[idx['sell_pr']]), to_num(cells[idx['sell_sum']]), 0.0
-        else:
-            continue
+def parse_stock_bond_trades_batch(file_path: StatementSource) -> OperationBatch:
+    workbook = load_statement(file_path)
+    df = workbook.raw
+    index = workbook.sections
+    if index.trades_start is None:
+        return OperationBatch.empty()
 
-        results.append(
-            OperationDTO(
-                date=dt.strftime('%Y-%m-%d %H:%M:%S'),
-                operation_type=op,
-                payment_sum=total,
-                currency=str(cells[idx['currency']]).strip(),
-                ticker=curr_ticker,
-                isin=curr_isin,
-                price=pr,
-                quantity=int(qty),
-                aci=aci,
-                comment='',
-                operation_id=str(cells[idx['num']]).strip()
-            ).to_dict()
-        )
-    return results
-
-
-def parse_bond_section(block: pd.DataFrame) -> List[dict]:
-    results: List[dict] = []
-    required = ['совершена', 'номер', 'куплено', 'продано', 'сумма', 'валюта', 'нкд покупки', 'нкд продажи']
-    hdr_idx = find_header_row(block, required)
-    if hdr_idx is None:
-        return results
-    headers = block.iloc[hdr_idx].astype(str).str.lower().tolist()
-
-    idx = {
-        'num':     find_column_index(headers, 'номер'),
-        'buy_qty': find_column_index(headers, 'куплено'),
-        'sell_qty':find_column_index(headers, 'продано'),
-        'buy_sum': find_column_index(headers, 'сумма', 'платеж'),
-        'sell_sum':find_column_index(headers, 'сумма', 'выруч'),
-        'currency':find_column_index(headers, 'валюта'),
-        'date':    find_column_index(headers, 'совершена'),
-        'aci_buy': find_column_index(headers, 'нкд', 'покупки'),
-        'aci_sell':find_column_index(headers, 'нкд', 'продажи'),
-    }
-    price_cols = [i for i, h in enumerate(headers) if 'цена' in h]
-    idx['buy_pr'], idx['sell_pr'] = (price_cols + [None, None])[:2]
-
-    curr_ticker, curr_isin = '', ''
-    for row in block.iloc[hdr_idx+1:].itertuples(index=False):
-        cells = list(row)
-        if all(pd.isna(c) or (isinstance(c, str) and not c.strip()) for c in cells):
-            break
-        if any(isinstance(c, str) and c.lower().startswith('итого') for c in cells):
-            continue
-        if is_ticker_row(cells):
-            curr_ticker, curr_isin = parse_ticker_and_isin_row(cells)
+    batches: List[OperationBatch] = []
+    for sect in index.trade_sections:
+        if sect.header is None:
             continue
-        dt = pd.to_datetime(f"{cells[idx['date']]} 00:00:00", dayfirst=True, errors='coerce')
-        if pd.isna(dt):
-            continue
-        buy = to_num(cells[idx['buy_qty']])
-        sell = to_num(cells[idx['sell_qty']])
-        if buy > 0:
-            op, qty, pr, total, aci = 'buy', buy, to_num(cells[idx['buy_pr']]), to_num(cells[idx['buy_sum']]), to_num(cells[idx['aci_buy']])
-        elif sell > 0:
-            op, qty, pr, total, aci = 'sell', sell, to_num(cells[idx['sell_pr']]), to_num(cells[idx['sell_sum']]), to_num(cells[idx['aci_sell']])
-        else:
-            continue
-        results.append(
-            OperationDTO(
-                date=dt.strftime('%Y-%m-%d %H:%M:%S'),
-                operation_type=op,
-                payment_sum=total,
-                currency=str(cells[idx['currency']]).strip(),
-                ticker=curr_ticker,
-                isin=curr_isin,
-                price=pr,
-                quantity=int(qty),
-                aci=aci,
-                comment='',
-                operation_id=str(cells[idx['num']]).strip()
-            ).to_dict()
-        )
-    return results
-
-
-def parse_stock_bond_trades(file_path: Union[str, Any]) -> List[dict]:
-    df = pd.read_excel(file_path, header=None)
-    start_idx = find_block_start(df, '2.1. сделки')
-    if start_idx is None:
-        return []
-    block = df.iloc[start_idx:].reset_index(drop=True)
-
-    section_indices, section_types = [], []
-    for i, row in block.iterrows():
-        text = ' '.join(str(c).lower() for c in row if pd.notna(c))
-        if 'акция' in text or 'адр' in text:
-            section_indices.append(i)
-            section_types.append('stock')
-        elif 'облигация' in text:
-            section_indices.append(i)
-            section_types.append('bond')
-    section_indices.append(len(block))
-
-    all_results: List[dict] = []
-    for (s, e), t in zip(zip(section_indices, section_indices[1:]), section_types):
-        sect = block.iloc[s+1:e].reset_index(drop=True)
-        if t == 'stock':
-            all_results.extend(parse_stock_section(sect))
-        else:
-            all_results.extend(parse_bond_section(sect))
-
-    return sorted(all_results, key=lambda x: x['date'])
-
-
+        # таблица подраздела заканчивается первой пустой строкой после заголовка
+        stop = index.next_blank(sect.header + 1, sect.end)
+        block = df.iloc[sect.header:stop]
+        batches.append(parse_trade_section_batch(block, SECTION_SPECS[sect.kind], 0))
 
+    return OperationBatch.concat(batches).sort_by_date()
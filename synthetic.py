@@ -0,0 +1,242 @@
+# synthetic.py
+#
+# Генератор синтетических выписок в формате брокерского отчёта (xlsx)
+# для нагрузочных прогонов парсеров (см. benchmark.py).
+
+import argparse
+import random
+from datetime import date, timedelta
+from typing import BinaryIO, List, Optional, Sequence, Tuple, Union
+
+#  Колонок в листе выписки (как в реальных отчётах: данные с колонки 1)
+SHEET_WIDTH = 19
+
+#  Валюты денежных блоков по порядку; первая — рубль
+CURRENCIES = ["Рубль", "USD", "CNY", "EUR", "HKD", "CHF", "GBP", "JPY", "KZT", "TRY", "AED"]
+
+#  Операции по счёту: (название, зачисление?, ISIN в примечании?)
+CASH_OPERATIONS = [
+    ("Приход ДС", True, False),
+    ("Вывод ДС", False, False),
+    ("Дивиденды", True, True),
+    ("Погашение купона", True, True),
+    ("НДФЛ", False, False),
+    ("Вознаграждение компании", False, False),
+    ("Проценты по займам \"овернайт\"", True, False),
+]
+
+CASH_HEADER = {1: "Дата", 2: "Операция", 6: "Сумма зачисления", 7: "Сумма списания",
+               8: "В т.ч.НДС (руб.)", 9: "Остаток (+/-)", 14: "Примечание"}
+FOREX_HEADER = {1: "Дата", 2: "Номер", 3: "Время", 4: "Курс сделки (покупка)",
+                5: "Объём в валюте лота (в ед. валюты)", 6: "Объём в сопряж. валюте (в ед. валюты)",
+                7: "Курс сделки (продажа)", 8: "Объём в валюте лота (в ед. валюты)",
+                9: "Объём в сопряж. валюте (в ед. валюты)", 10: "Дата соверш.", 11: "Время соверш.",
+                12: "Тип сделки", 13: "Дата исполнения", 14: "Место сделки"}
+STOCK_HEADER = {1: "Дата", 2: "Номер", 3: "Время", 4: "Куплено, шт", 5: "Цена", 6: "Сумма платежа",
+                7: "Продано, шт", 8: "Цена", 9: "Сумма выручки", 10: "Валюта", 11: "Валюта платежа",
+                12: "Дата соверш.", 13: "Время соверш.", 14: "Тип сделки (20*)", 17: "Место сделки"}
+BOND_HEADER = {1: "Дата", 2: "Номер", 3: "Время", 4: "Куплено, шт", 5: "Цена, %", 6: "Сумма платежа",
+               7: "НКД Покупки", 8: "Продано, шт", 9: "Цена, %", 10: "Сумма выручки", 11: "НКД Продажи",
+               12: "Валюта", 13: "Валюта платежа", 14: "Совершена", 16: "Дата расчётов", 18: "Место сделки"}
+
+_ALNUM = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+
+Row = List[object]
+
+
+def _row(cells: Optional[dict] = None) -> Row:
+    row: Row = [None] * SHEET_WIDTH
+    for col, value in (cells or {}).items():
+        row[col] = value
+    return row
+
+
+def _split(total: int, parts: int) -> List[int]:
+    """
+    total, разложенный на parts почти равных слагаемых.
+    """
+    base, extra = divmod(total, parts)
+    return [base + (1 if i < extra else 0) for i in range(parts)]
+
+
+def _dates(rng: random.Random, count: int, start: date, days: int) -> List[date]:
+    return sorted(start + timedelta(days=rng.randrange(days)) for _ in range(count))
+
+
+def _dmy(day: date) -> str:
+    return day.strftime("%d.%m.%y")
+
+
+def _clock(rng: random.Random) -> str:
+    return f"{rng.randrange(10, 19):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}"
+
+
+def _instruments(rng: random.Random, count: int) -> List[Tuple[str, str, str, str, str]]:
+    """
+    Инструменты (вид, тикер, рег. номер, ISIN, эмитент): первая половина — акции,
+    вторая — облигации (у облигаций тикер — ISIN, как в отчётах).
+    """
+    stocks = max(1, (count + 1) // 2) if count else 0
+    result = []
+    for i in range(count):
+        isin = "RU000" + "".join(rng.choice(_ALNUM) for _ in range(7))
+        if i < stocks:
+            result.append(("stock", f"TK{i:04d}", f"1-01-{i:05d}-A", isin, f"ПАО «Эмитент {i}»"))
+        else:
+            result.append(("bond", isin, f"4B02-{i:05d}-L", isin, f"ООО «Заёмщик {i}»"))
+    return result
+
+
+def _cash_block(rng: random.Random, count: int, currencies: Sequence[str], isins: Sequence[str],
+                start: date, days: int) -> List[Row]:
+    rows: List[Row] = []
+    for currency, n in zip(currencies, _split(count, len(currencies))):
+        rows.append(_row({1: currency}))
+        rows.append(_row(CASH_HEADER))
+        income_total = expense_total = 0.0
+        for day in _dates(rng, n, start, days):
+            name, income, with_isin = rng.choice(CASH_OPERATIONS)
+            amount = round(rng.uniform(1, 50000), 2)
+            comment = f"{name} по {rng.choice(isins)}" if with_isin and isins else None
+            rows.append(_row({1: _dmy(day), 2: name, 6: amount if income else 0, 7: 0 if income else amount,
+                              8: 0, 14: comment}))
+            income_total += amount if income else 0
+            expense_total += 0 if income else amount
+        rows.append(_row({1: f"Итого по валюте {currency}:", 6: round(income_total, 2),
+                          7: round(expense_total, 2)}))
+        rows.append(_row())
+    return rows
+
+
+def _forex_block(rng: random.Random, count: int, currencies: Sequence[str],
+                 start: date, days: int) -> List[Row]:
+    lots = [c for c in currencies if c != "Рубль"] or ["USD"]
+    rows: List[Row] = [_row({1: "Иностранная валюта"}), _row(), _row(FOREX_HEADER)]
+    number = 10_000_000_000
+    for lot, n in zip(lots, _split(count, len(lots))):
+        if not n:
+            continue
+        pair = f"{lot}RUB_TOM"
+        rows.append(_row({1: pair, 3: "Валюта лота:", 5: lot, 6: "Сопряж. валюта:", 8: "RUB"}))
+        for day in _dates(rng, n, start, days):
+            number += 1
+            rate = round(rng.uniform(10, 100), 4)
+            qty = rng.randrange(1, 1000)
+            side = 4 if rng.random() < 0.5 else 7
+            rows.append(_row({1: _dmy(day), 2: str(number), 3: _clock(rng), side: rate, side + 1: qty,
+                              side + 2: round(rate * qty, 2), 10: _dmy(day), 11: _clock(rng),
+                              12: "Т0", 13: _dmy(day), 14: "МосБирж(ВР/ДМ)"}))
+        rows.append(_row({1: f"Итого по {pair}:"}))
+    rows.append(_row())
+    return rows
+
+
+def _trades_block(rng: random.Random, count: int, instruments: Sequence[Tuple[str, str, str, str, str]],
+                  start: date, days: int) -> List[Row]:
+    rows: List[Row] = [_row({1: "2.1. Сделки:"}), _row()]
+    number = 20_000_000_000
+    per_instrument = list(zip(instruments, _split(count, len(instruments)))) if instruments else []
+    for kind, title, header in (("stock", "Акция", STOCK_HEADER), ("bond", "Облигация", BOND_HEADER)):
+        section = [(inst, n) for inst, n in per_instrument if inst[0] == kind and n]
+        if not section:
+            continue
+        rows.extend([_row({1: title}), _row({1: "Валюта цены = Рубль, валюта платежа = Рубль"}), _row(header)])
+        for (_, ticker, reg, isin, name), n in section:
+            rows.append(_row({1: ticker, 4: "Номер рег.:", 5: reg, 6: "ISIN:", 7: isin, 8: name}))
+            for day in _dates(rng, n, start, days):
+                number += 1
+                qty = rng.randrange(1, 500)
+                buy = rng.random() < 0.5
+                cells = {1: _dmy(day), 2: str(number)}
+                if kind == "stock":
+                    price = round(rng.uniform(1, 5000), 2)
+                    side = 4 if buy else 7
+                    cells.update({3: _clock(rng), side: qty, side + 1: price, side + 2: round(price * qty, 2),
+                                  10: "Рубль", 11: "Рубль", 12: _dmy(day), 13: _clock(rng),
+                                  14: "Т+", 17: "ММВБ"})
+                else:
+                    price = round(rng.uniform(80, 110), 4)
+                    side = 4 if buy else 8
+                    cells.update({side: qty, side + 1: price, side + 2: round(price * qty * 10, 2),
+                                  side + 3: round(rng.uniform(0, 50), 2), 12: "Рубль", 13: "Рубль",
+                                  14: _dmy(day), 16: _dmy(day), 18: "ММВБ"})
+                rows.append(_row(cells))
+            rows.append(_row({1: f"Итого по {ticker}:"}))
+        rows.append(_row())
+    return rows
+
+
+def statement_rows(cash_ops: int = 1000, fx_trades: int = 1000, trades: int = 1000,
+                   instruments: int = 10, currencies: int = 3, seed: int = 0) -> List[Row]:
+    """
+    Строки листа синтетической выписки:
+      cash_ops    — операций по счёту (делятся между currencies денежными блоками),
+      fx_trades   — сделок с валютой (по парам <валюта>RUB_TOM),
+      trades      — сделок с акциями и облигациями (по instruments инструментам),
+    Раскладка и якоря секций — как в реальных отчётах (см. sections.py).
+    """
+    if not 1 <= currencies <= len(CURRENCIES):
+        raise ValueError(f"currencies должно быть от 1 до {len(CURRENCIES)}")
+    if trades and instruments < 1:
+        raise ValueError("Для сделок нужен хотя бы один инструмент")
+
+    rng = random.Random(seed)
+    start, days = date(2023, 7, 1), 31
+    end = start + timedelta(days=days - 1)
+    used = CURRENCIES[:currencies]
+    insts = _instruments(rng, instruments)
+
+    rows: List[Row] = [
+        _row({1: "Брокерский отчет", 5: "ООО \"Компания\""}),
+        _row(),
+        _row({1: "Период:", 5: f"с {start:%d.%m.%Y} по {end:%d.%m.%Y}"}),
+        _row({1: "Клиент:", 5: "Синтетический Клиент"}),
+        _row({1: "Генеральное соглашение:", 5: "328110/17-иж от 03.08.2017"}),
+        _row(),
+        _row({1: "1. Движение денежных средств"}),
+        _row(),
+    ]
+    rows += _cash_block(rng, cash_ops, used, [i[3] for i in insts], start, days)
+    if fx_trades:
+        rows += _forex_block(rng, fx_trades, used, start, days)
+    if trades:
+        rows += _trades_block(rng, trades, insts, start, days)
+    rows += [_row(), _row({1: "Дата составления отчета:", 4: f"{end + timedelta(days=1):%d.%m.%Y}"})]
+    return rows
+
+
+def generate_statement(path: Union[str, BinaryIO], cash_ops: int = 1000, fx_trades: int = 1000, trades: int = 1000,
+                       instruments: int = 10, currencies: int = 3, seed: int = 0) -> int:
+    """
+    Записывает синтетическую выписку (см. statement_rows) в xlsx-файл path
+    (путь или бинарный файловый объект).
+    Возвращает число строк листа.
+    """
+    from openpyxl import Workbook
+
+    rows = statement_rows(cash_ops, fx_trades, trades, instruments, currencies, seed)
+    book = Workbook(write_only=True)
+    sheet = book.create_sheet("Sheet1")
+    for row in rows:
+        sheet.append(row)
+    book.save(path)
+    return len(rows)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Синтетическая выписка брокера (xlsx)")
+    parser.add_argument("path", help="куда записать .xlsx")
+    parser.add_argument("--cash-ops", type=int, default=1000, help="операций по счёту")
+    parser.add_argument("--fx-trades", type=int, default=1000, help="сделок с валютой")
+    parser.add_argument("--trades", type=int, default=1000, help="сделок с акциями и облигациями")
+    parser.add_argument("--instruments", type=int, default=10, help="различных бумаг")
+    parser.add_argument("--currencies", type=int, default=3, help="валют (денежных блоков)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    n = generate_statement(args.path, args.cash_ops, args.fx_trades, args.trades,
+                           args.instruments, args.currencies, args.seed)
+    print(f"{args.path}: {n} строк")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The modules live at the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def sample(name: str) -> str:
+    return os.path.join(ROOT, name)
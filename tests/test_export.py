@@ -0,0 +1,30 @@
+import pytest
+
+from conftest import sample
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from export import export_statement, operations_schema  # noqa: E402
+from full_statement import parse_full_statement_batch  # noqa: E402
+
+STATEMENTS = ["2.xls", "4.xls", "adr.xls", "pensil.XLSX"]
+
+
+def test_statements_export_identical_schemas(tmp_path):
+    parquet, arrow = [], []
+    for name in STATEMENTS:
+        result = parse_full_statement_batch(sample(name))
+        path = tmp_path / f"{name}.parquet"
+        export_statement(result, str(path), "parquet")
+        parquet.append(pq.read_schema(path).remove_metadata())
+        path = tmp_path / f"{name}.arrow"
+        export_statement(result, str(path), "arrow")
+        with pa.ipc.open_file(path) as reader:
+            arrow.append(reader.schema.remove_metadata())
+
+    expected = operations_schema()
+    assert all(schema.equals(expected) for schema in arrow)
+    assert all(schema.equals(expected) for schema in parquet)
+    assert parquet[0].field("date").type == pa.timestamp("ms")
+    assert parquet[0].field("quantity").type == pa.float64()
@@ -0,0 +1,23 @@
+from ledger import LedgerStore
+from OperationDTO import OperationBatch
+
+
+def statement(price: float):
+    operations = OperationBatch.from_columns(
+        1, date=["2023-05-08 13:18:01"], operation_type=["buy"], payment_sum=[price * 2], currency=["RUB"],
+        ticker=["OZON_US"], price=[price], quantity=[2], operation_id=["T-1"])
+    return {"account_id": "328110", "operations": operations}
+
+
+def test_out_of_order_ack_does_not_roll_back(tmp_path):
+    store = LedgerStore(str(tmp_path))
+    first = store.ingest(statement(100.0), commit=False)["ingest"]
+    second = store.ingest(statement(101.0), commit=False)["ingest"]
+    assert first["new"] == second["new"] == 1
+
+    assert store.commit("328110", second["cursor"])["committed"] == 1
+    late = store.commit("328110", first["cursor"])
+    assert late["committed"] == 0 and late["stale"] == 1
+
+    again = store.ingest(statement(101.0), use_watermark=False, commit=False)["ingest"]
+    assert again["unchanged"] == 1 and again["changed"] == 0 and again["cursor"] is None
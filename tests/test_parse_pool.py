@@ -0,0 +1,59 @@
+import asyncio
+import os
+import signal
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from conftest import sample
+from parse_pool import ParsePool
+
+
+def test_pool_recovers_after_worker_dies():
+    async def scenario():
+        pool = ParsePool(workers=1, timeout=30)
+        try:
+            await pool.warm_up()
+            with pytest.raises(BrokenProcessPool):
+                await pool.submit(os._exit, 1)
+            assert not pool.ready
+            assert await pool.submit(os.getpid) > 0
+            for _ in range(300):
+                if pool.ready:
+                    break
+                await asyncio.sleep(0.1)
+            assert pool.ready
+            assert pool.restarts >= 1
+        finally:
+            pool.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_request_after_worker_killed(monkeypatch, tmp_path):
+    monkeypatch.setenv("PARSER_WORKERS", "1")
+    monkeypatch.setenv("PARSER_JOBS_DIR", str(tmp_path))
+    from fastapi.testclient import TestClient
+    import importlib
+    import main
+    main = importlib.reload(main)
+
+    def wait_ready(client):
+        for _ in range(300):
+            if client.get("/readyz").status_code == 200:
+                return
+            time.sleep(0.1)
+        pytest.fail("pool did not become ready")
+
+    with TestClient(main.app) as client:
+        wait_ready(client)
+        pid = next(iter(main.parse_pool._executor._processes))
+        os.kill(pid, signal.SIGKILL)
+        time.sleep(0.5)
+        with open(sample("2.xls"), "rb") as fh:
+            response = client.post("/parse-statement", files={"file": ("2.xls", fh.read())})
+        assert response.status_code == 200, response.text
+        assert response.headers["X-Cache"] == "miss"
+        assert response.json()["operations"]
+        wait_ready(client)
@@ -1,16 +1,16 @@
 from typing import Any, Optional, Dict
-from datetime import datetime
-
-import xlrd
 
 import re
 
 
-from typing import Any, List, Optional, Tuple, Dict
+from typing import Any, Optional, Tuple, Dict
 
+import numpy as np
 import pandas as pd
 
-from constants import CURRENCY_DICT, SPECIAL_OPERATION_HANDLERS, OPERATION_TYPE_MAP
+from classifier import ISIN_RE, OPERATION_CLASSIFIER
+#  Разбор дат и map_unique живут в dates.py; здесь — для прежних импортов
+from dates import map_unique, parse_date  # noqa: F401
 
 
 def to_num(x: Any) -> float:
@@ -32,41 +32,57 @@ def extract_isin(comment: Any) -> str:
     Работает даже если передали float/None.
     """
     text = str(comment or "")
-    m = re.search(r"\b[A-Z]{2}[A-Z0-9]{10}\b", text)
+    m = ISIN_RE.search(text)
     return m.group(0) if m else ""
 
 
-def find_column_index(headers: List[str], *keywords: str) -> Optional[int]:
+def _float_or_none(text: str) -> Optional[float]:
+    try:
+        return float(text)
+    except (ValueError, TypeError):
+        return None
+
+
+def _parse_floats(texts: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Находит индекс первой колонки, в названии которой есть все keywords.
+    float() по колонке строк. Возвращает значения и маску успешного разбора.
+    Быстрый путь — один astype(float); при ошибке разбираем поштучно.
     """
-    for i, h in enumerate(headers):
-        if all(k in h for k in keywords):
-            return i
-    return None
+    try:
+        values = texts.astype(float).to_numpy()
+        return values, np.ones(len(values), dtype=bool)
+    except (ValueError, TypeError):
+        parsed = [_float_or_none(t) for t in texts]
+        ok = np.array([v is not None for v in parsed], dtype=bool)
+        values = np.array([np.nan if v is None else v for v in parsed], dtype=float)
+        return values, ok
 
 
-def find_header_row(df: pd.DataFrame, required: List[str]) -> Optional[int]:
+def to_num_column(values: pd.Series) -> np.ndarray:
     """
-    Ищет в DataFrame первую строку, где встречаются все required keywords.
-    Возвращает индекс строки или None.
+    Колоночный аналог to_num: NaN и некорректные значения -> 0.0.
     """
-    for i, row in df.iterrows():
-        cells = [str(c).lower() for c in row if pd.notna(c)]
-        if all(any(req in cell for cell in cells) for req in required):
-            return i
-    return None
+    present = values.notna().to_numpy()
+    result = np.zeros(len(values), dtype=float)
+    if present.any():
+        texts = values[present].astype(str).str.replace(",", ".", regex=False)
+        parsed, ok = _parse_floats(texts)
+        result[present] = np.where(ok, parsed, 0.0)
+    return result
 
 
-def find_block_start(df: pd.DataFrame, keyword: str) -> Optional[int]:
+def is_nonzero_column(values: pd.Series) -> np.ndarray:
     """
-    Находит первую строку, содержащую keyword, и возвращает следующий индекс.
+    Колоночный аналог constants.is_nonzero. Как и скалярная версия,
+    считает NaN ненулевым значением (str(NaN) == "nan").
     """
-    for i, row in df.iterrows():
-        text = " ".join(str(c).lower() for c in row if pd.notna(c))
-        if keyword.lower() in text:
-            return i + 1
-    return None
+    texts = (
+        values.astype(str)
+        .str.replace(",", ".", regex=False)
+        .str.replace(" ", "", regex=False)
+    )
+    parsed, ok = _parse_floats(texts)
+    return ok & (parsed != 0)
 
 
 def parse_header_data(row_str: str, header_data: Dict[str, Optional[str]]) -> None:
@@ -97,50 +113,7 @@ def parse_header_data(row_str: str, header_data: Dict[str, Optional[str]]) -> No
 
 def detect_operation_type(op: str, inc: Any, exp: Any) -> str:
     """
-    Универсальный детектор типа операции.
+    Универсальный детектор типа операции (правила — в constants,
+    см. classifier.OperationClassifier).
     """
-    if not isinstance(op, str):
-        return "other"
-    if "покупка" in op.lower():
-        return "buy"
-    if "продажа" in op.lower():
-        return "sell"
-    if op in SPECIAL_OPERATION_HANDLERS:
-        return SPECIAL_OPERATION_HANDLERS[op](inc, exp)
-    return OPERATION_TYPE_MAP.get(op, "other")
-
-
-
-
-def parse_date(value: Any) -> Optional[str]:
-    """
-    Универсальный парсер даты.
-    Поддерживает:
-    - datetime.datetime
-    - Excel float/int дату (как в .xls)
-    - Строки в формате 'дд.мм.гггг' или 'дд.мм.гг'
-    Возвращает строку в формате 'YYYY-MM-DD' или None.
-    """
-    if not value:
-        return None
-
-    if isinstance(value, datetime):
-        return value.strftime("%Y-%m-%d")
-
-    if isinstance(value, (int, float)):
-        try:
-            date = datetime(*xlrd.xldate_as_tuple(value, 0))
-            return date.strftime("%Y-%m-%d")
-        except Exception:
-            return None
-
-    if isinstance(value, str):
-        value = value.strip()
-        for fmt in ("%d.%m.%Y", "%d.%m.%y"):
-            try:
-                return datetime.strptime(value, fmt).strftime("%Y-%m-%d")
-            except ValueError:
-                continue
-
-    return None
-
+    return OPERATION_CLASSIFIER.classify(op, inc, exp)
@@ -0,0 +1,112 @@
+# workbook.py
+
+import io
+import os
+from functools import cached_property
+from typing import Any, BinaryIO, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from reader import DEFAULT_ENGINE, ENGINES, read_rows
+from sections import SectionIndex, build_section_index
+
+#  Строки, которые pd.read_excel по умолчанию считает пропусками
+NA_STRINGS = {
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a",
+    "nan", "null",
+}
+
+
+def cell_to_str(value: Any) -> Any:
+    """
+    Приводит сырую ячейку к строке так же, как это делает
+    pd.read_excel(..., dtype=str): целые float -> "123", NaN остаётся NaN.
+    """
+    if value is None or value is pd.NaT:
+        return np.nan
+    if isinstance(value, float):
+        if np.isnan(value):
+            return np.nan
+        if value.is_integer():
+            return str(int(value))
+    return str(value)
+
+
+def frame_from_rows(rows: List[list]) -> pd.DataFrame:
+    """
+    Собирает DataFrame из строк низкоуровневого ридера с теми же типами
+    колонок, что дал бы pd.read_excel(header=None): NA-строки -> NaN,
+    полностью числовые колонки -> числовой dtype, остальные — object.
+    """
+    width = max((len(r) for r in rows), default=0)
+    padded = [r if len(r) == width else list(r) + [None] * (width - len(r)) for r in rows]
+    columns = {}
+    for j, cells in enumerate(zip(*padded)):
+        col = pd.Series(
+            [np.nan if v is None or (v.__class__ is str and v in NA_STRINGS) else v for v in cells],
+            dtype=object,
+        )
+        try:
+            col = pd.to_numeric(col)
+        except (ValueError, TypeError):
+            pass
+        columns[j] = col
+    return pd.DataFrame(columns, index=pd.RangeIndex(len(rows)))
+
+
+class StatementWorkbook:
+    """
+    Лист брокерской выписки, прочитанный из Excel один раз.
+    Общий контекст для всех парсеров секций:
+      - raw  — значения ячеек как их отдаёт pd.read_excel(header=None)
+      - text — строковое представление (аналог dtype=str),
+               строится из raw без повторного декодирования файла
+      - sections — индекс якорей секций, строится одним проходом по листу
+    """
+
+    def __init__(self, raw: pd.DataFrame, source: Any = None, sections: Optional[SectionIndex] = None):
+        self.raw = raw
+        self.source = source
+        if sections is not None:
+            # индекс уже построен (например, в другом процессе) — не строим заново
+            self.__dict__["sections"] = sections
+
+    @classmethod
+    def read(cls, source: Any, engine: Optional[str] = None) -> "StatementWorkbook":
+        """
+        engine="pandas" — pd.read_excel; engine="native" — прямое чтение
+        xlrd/openpyxl (reader.read_rows) без TextParser.
+        """
+        engine = engine or DEFAULT_ENGINE
+        if engine not in ENGINES:
+            raise ValueError(f"Неизвестный движок чтения: {engine}")
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            # содержимое файла целиком в памяти — читаем без записи на диск
+            source = io.BytesIO(source)
+        if engine == "native":
+            return cls(frame_from_rows(read_rows(source)), source=source)
+        return cls(pd.read_excel(source, header=None), source=source)
+
+    @cached_property
+    def text(self) -> pd.DataFrame:
+        return self.raw.astype(object).map(cell_to_str)
+
+    @cached_property
+    def sections(self) -> SectionIndex:
+        return build_section_index(self.raw)
+
+
+#  Путь, содержимое файла (bytes) или открытый бинарный файловый объект
+StatementSource = Union[str, os.PathLike, bytes, BinaryIO, StatementWorkbook]
+
+
+def load_statement(source: StatementSource, engine: Optional[str] = None) -> StatementWorkbook:
+    """
+    Возвращает контекст выписки: уже загруженный передаётся как есть,
+    путь, bytes или файловый объект читается один раз выбранным движком.
+    """
+    if isinstance(source, StatementWorkbook):
+        return source
+    return StatementWorkbook.read(source, engine)